@@ -0,0 +1,98 @@
+"""Micro-benchmark: shared dynamo_codec vs boto3 TypeDeserializer + convert_decimal.
+
+Decodes a 10k-item page of low-level DynamoDB items shaped like PDFs-table rows and
+checks both paths produce the same values first.
+
+    python benchmarks/bench_dynamo_codec.py
+"""
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'shared', 'python'))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+from dynamo_codec import deserialize_items  # noqa: E402
+
+PAGE_SIZE = 10_000
+ROUNDS = 5
+
+
+def convert_decimal(obj):
+    # Previous implementation, formerly in get_user_pdfs.py and helpers/dynamo_helpers.py
+    if isinstance(obj, list):
+        return [convert_decimal(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {k: convert_decimal(v) for k, v in obj.items()}
+    elif isinstance(obj, Decimal):
+        if obj % 1 == 0:
+            return int(obj)
+        else:
+            return float(obj)
+    else:
+        return obj
+
+
+def make_page() -> list[dict]:
+    serializer = TypeSerializer()
+    rows = []
+    for i in range(PAGE_SIZE):
+        row = {
+            'user_id': 'a1b2c3d4-0000-0000-0000-000000000000',
+            'pdf_id': f'{i:08d}-0000-0000-0000-000000000000',
+            'status': 'processing completed',
+            'filename': f'report-{i}.pdf',
+            'uploaded_at': '2026-01-01T00:00:00+00:00',
+            'processed_at': '2026-01-01T00:01:00+00:00',
+            'processed_s3_uri': f's3://bucket/user/2026/01/01/report-{i}_processed.pdf',
+            'size_bytes': 123456 + i,
+            'usage': {
+                'input_tokens': 1000 + i, 'output_tokens': 200, 'total_tokens': 1200 + i,
+                'latency_ms': 3456, 'cost_usd': Decimal('0.0123'), 'model': 'model-id',
+                'route': 'default', 'config_version': '1',
+            },
+        }
+        rows.append({k: serializer.serialize(v) for k, v in row.items()})
+    return rows
+
+
+def edge_cases() -> list[dict]:
+    numbers = ['0', '-7', '2.0', '1e3', '0.5', '-1.25', '12345678901234567890',
+               '12345678901234567890.5', '1.5e-7', '9007199254740993']
+    return [{'n': {'N': n}} for n in numbers]
+
+
+def boto3_path(items: list[dict]) -> list[dict]:
+    deserializer = TypeDeserializer()
+    return convert_decimal([{k: deserializer.deserialize(v) for k, v in item.items()} for item in items])
+
+
+def best_of(fn, items) -> float:
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fn(items)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    page = make_page()
+
+    assert boto3_path(page) == deserialize_items(page), 'codec output differs from boto3 path'
+    for item in edge_cases():
+        expected = boto3_path([item])[0]
+        actual = deserialize_items([item])[0]
+        assert actual == expected and type(actual['n']) is type(expected['n']), (item, expected, actual)
+    assert isinstance(deserialize_items([{'n': {'N': '12345678901234567890.5'}}])[0]['n'], float)
+
+    before = best_of(boto3_path, page)
+    after = best_of(deserialize_items, page)
+    print(f"{PAGE_SIZE} items, best of {ROUNDS}")
+    print(f"  TypeDeserializer + convert_decimal: {before * 1000:8.1f} ms")
+    print(f"  dynamo_codec.deserialize_items:     {after * 1000:8.1f} ms  ({before / after:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
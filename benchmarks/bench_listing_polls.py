@@ -0,0 +1,123 @@
+"""Bytes, PDF rows read and latency per poll of get_user_pdfs.handler, with and without If-None-Match.
+
+Uses a synthetic 5k-row listing served by an in-memory DynamoDB paginator; URL signing
+is done locally by botocore with dummy credentials, so no AWS access is needed. Unchanged
+polls are measured both with a listing version on the quota row and for a quota row
+written before it existed, which falls back to hashing the full listing.
+
+    python benchmarks/bench_listing_polls.py
+"""
+import contextlib
+import gzip
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src', 'backend'))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'shared', 'python'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+os.environ['PROCESSED_PDF_BUCKET_NAME'] = 'processed-bucket'
+os.environ['PDFS_TABLE_NAME'] = 'pdfs-table'
+os.environ['USER_QUOTA_TABLE_NAME'] = 'user-quota-table'
+
+import get_user_pdfs  # noqa: E402
+
+ROWS = 5_000
+PAGE_SIZE = 1_000
+POLLS = 20
+USER_ID = 'a1b2c3d4-0000-0000-0000-000000000000'
+
+
+class FakePaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, **kwargs):
+        for start in range(0, len(self.client.items), PAGE_SIZE):
+            page = self.client.items[start:start + PAGE_SIZE]
+            self.client.rows_read += len(page)
+            yield {'Items': page}
+
+
+class FakeDynamoClient:
+    def __init__(self, items, listing_version):
+        self.items = items
+        self.listing_version = listing_version
+        self.rows_read = 0
+
+    def get_item(self, **kwargs):
+        if self.listing_version is None:
+            return {'Item': {'userId': {'S': USER_ID}}}
+        return {'Item': {'userId': {'S': USER_ID}, 'listingVersion': {'N': str(self.listing_version)}}}
+
+    def get_paginator(self, operation):
+        return FakePaginator(self)
+
+
+def make_rows() -> list[dict]:
+    rows = []
+    for i in range(ROWS):
+        pdf_id = f'{i:08d}-0000-0000-0000-000000000000'
+        rows.append({
+            'user_id': {'S': USER_ID},
+            'pdf_id': {'S': pdf_id},
+            'status': {'S': 'processing completed'},
+            'filename': {'S': f'report-{i}.pdf'},
+            'uploaded_at': {'S': f'2026-01-01T00:{i % 60:02d}:00+00:00'},
+            'processed_at': {'S': f'2026-01-01T01:{i % 60:02d}:00+00:00'},
+            'processed_s3_uri': {'S': f's3://processed-bucket/{USER_ID}/2026/01/01/report-{i}_processed.pdf'},
+            'size_bytes': {'N': str(100_000 + i)},
+        })
+    return rows
+
+
+def make_event(if_none_match: str | None = None) -> dict:
+    event = {'httpMethod': 'GET', 'requestContext': {'authorizer': {'claims': {'sub': USER_ID}}}, 'headers': {}}
+    if if_none_match:
+        event['headers']['If-None-Match'] = if_none_match
+    return event
+
+
+def poll(event) -> tuple[dict, float, int]:
+    best = float('inf')
+    result = None
+    get_user_pdfs.dynamodb.rows_read = 0
+    for _ in range(POLLS):
+        # The handler logs the event; keep that out of the measurement output
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = get_user_pdfs.handler(event, None)
+            best = min(best, time.perf_counter() - started)
+    return result, best, get_user_pdfs.dynamodb.rows_read // POLLS
+
+
+def main():
+    rows = make_rows()
+
+    get_user_pdfs.dynamodb = FakeDynamoClient(rows, listing_version=42)
+    full, full_time, full_rows = poll(make_event())
+    cached, cached_time, cached_rows = poll(make_event(full['headers']['ETag']))
+    assert full['statusCode'] == 200 and cached['statusCode'] == 304
+
+    get_user_pdfs.dynamodb = FakeDynamoClient(rows, listing_version=None)
+    legacy_full, _, _ = poll(make_event())
+    legacy, legacy_time, legacy_rows = poll(make_event(legacy_full['headers']['ETag']))
+    assert legacy['statusCode'] == 304
+
+    body = full['body'].encode()
+    print(f"{ROWS} rows, best of {POLLS} polls")
+    print(f"  200 full listing:          {len(body):9d} bytes ({len(gzip.compress(body)):d} gzipped)  "
+          f"{full_rows:5d} rows read  {full_time * 1000:8.1f} ms")
+    print(f"  304 listing version:       {len(cached['body'].encode()):9d} bytes  "
+          f"{cached_rows:5d} rows read  {cached_time * 1000:8.1f} ms")
+    print(f"  304 without version (old): {len(legacy['body'].encode()):9d} bytes  "
+          f"{legacy_rows:5d} rows read  {legacy_time * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""End-to-end latency of processor.run_llm_stage with preflight on and off.
+
+The model is a local stand-in whose latency grows with the size of the request it is
+sent (a fixed overhead plus a per-MB cost), approximating upload and input-token time
+on Bedrock. The PDF is a synthetic scanned document: full-page 300 dpi images and no
+text layer. The real prompt builder, preflight and routing code run unchanged.
+
+    python benchmarks/bench_preflight_latency.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src', 'data'))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'shared', 'python'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+for name in ('RAW_PDF_BUCKET_NAME', 'PROCESSED_PDF_BUCKET_NAME', 'CONFIGS_TABLE_NAME',
+             'PDFS_TABLE_NAME', 'USER_QUOTA_TABLE_NAME', 'USAGE_STATS_TABLE_NAME'):
+    os.environ.setdefault(name, 'benchmark')
+
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import processor  # noqa: E402
+
+PAGES = 4
+PAGE_DPI = 300
+RUNS = 3
+# Fake model cost: fixed overhead plus time proportional to the request payload
+MODEL_BASE_SECONDS = 0.2
+MODEL_SECONDS_PER_MB = 0.4
+
+PREFLIGHT_CONFIG = {'enabled': True, 'max_dpi': 150, 'jpeg_quality': 75}
+
+
+def make_scanned_pdf() -> bytes:
+    """Letter-size pages, each a single full-page noisy image like a phone scan."""
+    width, height = int(8.5 * PAGE_DPI), int(11 * PAGE_DPI)
+    pages = []
+    for _ in range(PAGES):
+        noise = Image.frombytes('L', (width // 4, height // 4), os.urandom((width // 4) * (height // 4)))
+        page = Image.merge('RGB', [noise.resize((width, height))] * 3)
+        pages.append(page)
+    out = io.BytesIO()
+    pages[0].save(out, 'PDF', save_all=True, append_images=pages[1:], resolution=PAGE_DPI, quality=90)
+    return out.getvalue()
+
+
+class FakeModel:
+    """Stands in for ChatBedrock: sleeps in proportion to the serialized request size."""
+
+    def __init__(self):
+        self.payload_bytes = 0
+
+    def _invoke(self, prompt_value):
+        payload_bytes = sum(len(str(message.content)) for message in prompt_value.to_messages())
+        self.payload_bytes = payload_bytes
+        time.sleep(MODEL_BASE_SECONDS + payload_bytes / 1_000_000 * MODEL_SECONDS_PER_MB)
+        raw = AIMessage(content='', usage_metadata={
+            'input_tokens': payload_bytes // 4, 'output_tokens': 50, 'total_tokens': payload_bytes // 4 + 50,
+        })
+        return {'raw': raw, 'parsed': processor.ResponseModel(description='A scanned document'), 'parsing_error': None}
+
+    def with_structured_output(self, schema, include_raw=False):
+        return RunnableLambda(self._invoke)
+
+
+def run(pdf_bytes: bytes, preflight_config: dict) -> tuple[float, int]:
+    model = FakeModel()
+    config = {
+        'model_config': {'model': 'fake-model', 'boto_config': {}},
+        'prompt_config': {'system_message': 'Describe the document.', 'user_message': 'What is in this PDF?'},
+        'preflight': preflight_config,
+    }
+    processor.get_dynamo_item = lambda table_name, key: config
+    processor.get_model_from_config = lambda route, time_budget=None: model
+
+    best = float('inf')
+    for _ in range(RUNS):
+        # Keep the stage's log lines and EMF metrics out of the measurement output
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            processor.run_llm_stage(pdf_bytes, 'benchmark-file')
+            best = min(best, time.perf_counter() - started)
+    return best, model.payload_bytes
+
+
+def main():
+    pdf_bytes = make_scanned_pdf()
+
+    off_time, off_payload = run(pdf_bytes, {})
+    on_time, on_payload = run(pdf_bytes, PREFLIGHT_CONFIG)
+    assert on_payload < off_payload
+
+    print(f"{PAGES}-page scanned PDF, {len(pdf_bytes)} bytes, best of {RUNS} runs")
+    print(f"  fake model: {MODEL_BASE_SECONDS * 1000:.0f} ms + {MODEL_SECONDS_PER_MB * 1000:.0f} ms/MB of request")
+    print(f"  preflight off: {off_payload:9d} request bytes  {off_time * 1000:8.1f} ms")
+    print(f"  preflight on:  {on_payload:9d} request bytes  {on_time * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
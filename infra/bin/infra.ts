@@ -34,5 +34,6 @@ const coreStack = new CoreStack(app, `${stackName}-core-${stackEnv}`, stackEnv,
 // Dependencies
 backendStack.node.addDependency(dataStack);
 backendStack.node.addDependency(coreStack);
+dataStack.node.addDependency(coreStack);
 frontendStack.node.addDependency(coreStack);
 frontendStack.node.addDependency(backendStack);
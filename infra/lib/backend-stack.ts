@@ -1,5 +1,5 @@
 import * as apigateway from 'aws-cdk-lib/aws-apigateway';
-import { Stack, StackProps, Duration } from 'aws-cdk-lib';
+import { Stack, StackProps, Duration, Size } from 'aws-cdk-lib';
 import * as s3 from 'aws-cdk-lib/aws-s3';
 import { Construct } from 'constructs';
 import * as lambda from 'aws-cdk-lib/aws-lambda';
@@ -7,6 +7,7 @@ import * as path from 'path';
 import * as cognito from 'aws-cdk-lib/aws-cognito';
 import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
 import * as events from 'aws-cdk-lib/aws-events';
+import * as targets from 'aws-cdk-lib/aws-events-targets';
 import { createStackParameters, getSsmParameters } from './parameters';
 
 const ssmParams = {
@@ -20,6 +21,7 @@ const ssmParams = {
   NEW_USER_QUOTA: 'NEW_USER_QUOTA',
   STRIPE_GOLD_PRICE_ID: 'STRIPE_GOLD_PRICE_ID',
   STRIPE_PLATINUM_PRICE_ID: 'STRIPE_PLATINUM_PRICE_ID',
+  USAGE_STATS_TABLE_NAME: 'USAGE_STATS_TABLE_NAME',
 };
 
 export class BackendStack extends Stack {
@@ -34,6 +36,7 @@ export class BackendStack extends Stack {
     const userQuotaTable = dynamodb.TableV2.fromTableName(this, 'ImportedUserQuotaTable', params.USER_QUOTA_TABLE_NAME);
     const eventBus = events.EventBus.fromEventBusName(this, 'ImportedEventBus', params.UPLOAD_EVENT_BUS_NAME);
     const pdfsTable = dynamodb.TableV2.fromTableName(this, 'ImportedPdfsTable', params.PDFS_TABLE_NAME);
+    const usageStatsTable = dynamodb.TableV2.fromTableName(this, 'ImportedUsageStatsTable', params.USAGE_STATS_TABLE_NAME);
 
       // Lambda Layer with dependencies (numpy, python-dotenv) bundled via Docker
       const backendLayer = new lambda.LayerVersion(this, 'BackendLayer', {
@@ -51,6 +54,14 @@ export class BackendStack extends Stack {
         description: 'Layer for backend Lambda functions',
       });
 
+    // Layer with modules shared by the backend and data Lambdas (src/shared/python -> /opt/python)
+    const sharedLayer = new lambda.LayerVersion(this, 'SharedLayer', {
+      layerVersionName: `pdf-analyzer-backend-shared-layer-${stackEnv}`,
+      code: lambda.Code.fromAsset(path.join(__dirname, '../../src/shared')),
+      compatibleRuntimes: [lambda.Runtime.PYTHON_3_13],
+      description: 'Shared modules (DynamoDB codec) for backend Lambda functions',
+    });
+
     // Lambda function for PDF upload
     const uploadFunction = new lambda.Function(this, 'UploadFunction', {
       functionName: `pdf-analyzer-upload-${stackEnv}`,
@@ -58,7 +69,7 @@ export class BackendStack extends Stack {
       handler: 'upload.handler',
       code: lambda.Code.fromAsset(path.join(__dirname, '../../src/backend')),
       timeout: Duration.seconds(30),
-      layers: [backendLayer],
+      layers: [backendLayer, sharedLayer],
       memorySize: 256,
       environment: {
         ENVIRONMENT: stackEnv,
@@ -70,6 +81,26 @@ export class BackendStack extends Stack {
       },
     });
 
+    // Lambda function for batch PDF upload (folders of PDFs in a single request)
+    const batchUploadFunction = new lambda.Function(this, 'BatchUploadFunction', {
+      functionName: `pdf-analyzer-batch-upload-${stackEnv}`,
+      runtime: lambda.Runtime.PYTHON_3_13,
+      handler: 'upload.batch_handler',
+      code: lambda.Code.fromAsset(path.join(__dirname, '../../src/backend')),
+      timeout: Duration.seconds(60),
+      layers: [backendLayer, sharedLayer],
+      memorySize: 512,
+      environment: {
+        ENVIRONMENT: stackEnv,
+        RAW_PDF_BUCKET_NAME: params.RAW_PDF_BUCKET_NAME,
+        USER_QUOTA_TABLE_NAME: params.USER_QUOTA_TABLE_NAME,
+        NEW_USER_QUOTA: params.NEW_USER_QUOTA,
+        UPLOAD_EVENT_BUS_NAME: params.UPLOAD_EVENT_BUS_NAME,
+        PDFS_TABLE_NAME: params.PDFS_TABLE_NAME,
+        MAX_BATCH_FILES: '50',
+      },
+    });
+
     // Lambda function for listing processed PDFs
     const getUserPdfsFunction = new lambda.Function(this, 'GetProcessedPdfsFunction', {
       functionName: `pdf-analyzer-get-processed-pdfs-${stackEnv}`,
@@ -77,13 +108,65 @@ export class BackendStack extends Stack {
       handler: 'get_user_pdfs.handler',
       code: lambda.Code.fromAsset(path.join(__dirname, '../../src/backend')),
       timeout: Duration.seconds(30),
-      layers: [backendLayer],
+      layers: [backendLayer, sharedLayer],
       memorySize: 256,
       environment: {
         ENVIRONMENT: stackEnv,
         PROCESSED_PDF_BUCKET_NAME: params.PROCESSED_PDF_BUCKET_NAME,
         URL_EXPIRY_SECONDS: '900',
         PDFS_TABLE_NAME: params.PDFS_TABLE_NAME,
+        USER_QUOTA_TABLE_NAME: params.USER_QUOTA_TABLE_NAME,
+      },
+    });
+
+    // Lambda function for per-user usage stats (O(1) read of the counters on the quota table)
+    const getUserStatsFunction = new lambda.Function(this, 'GetUserStatsFunction', {
+      functionName: `pdf-analyzer-get-user-stats-${stackEnv}`,
+      runtime: lambda.Runtime.PYTHON_3_13,
+      handler: 'get_user_stats.handler',
+      code: lambda.Code.fromAsset(path.join(__dirname, '../../src/backend')),
+      timeout: Duration.seconds(10),
+      layers: [backendLayer, sharedLayer],
+      memorySize: 256,
+      environment: {
+        ENVIRONMENT: stackEnv,
+        USER_QUOTA_TABLE_NAME: params.USER_QUOTA_TABLE_NAME,
+      },
+    });
+
+    // Scheduled job rebuilding the usage counters from the PDFs table to repair drift
+    const reconcileUserStatsFunction = new lambda.Function(this, 'ReconcileUserStatsFunction', {
+      functionName: `pdf-analyzer-reconcile-user-stats-${stackEnv}`,
+      runtime: lambda.Runtime.PYTHON_3_13,
+      handler: 'reconcile_user_stats.handler',
+      code: lambda.Code.fromAsset(path.join(__dirname, '../../src/backend')),
+      timeout: Duration.minutes(15),
+      layers: [backendLayer, sharedLayer],
+      memorySize: 512,
+      environment: {
+        ENVIRONMENT: stackEnv,
+        USER_QUOTA_TABLE_NAME: params.USER_QUOTA_TABLE_NAME,
+        PDFS_TABLE_NAME: params.PDFS_TABLE_NAME,
+      },
+    });
+
+    new events.Rule(this, 'ReconcileUserStatsSchedule', {
+      schedule: events.Schedule.rate(Duration.days(1)),
+      targets: [new targets.LambdaFunction(reconcileUserStatsFunction)],
+    });
+
+    // Lambda function for rolled-up model usage (internal, IAM-authorized)
+    const getUsageStatsFunction = new lambda.Function(this, 'GetUsageStatsFunction', {
+      functionName: `pdf-analyzer-get-usage-stats-${stackEnv}`,
+      runtime: lambda.Runtime.PYTHON_3_13,
+      handler: 'get_usage_stats.handler',
+      code: lambda.Code.fromAsset(path.join(__dirname, '../../src/backend')),
+      timeout: Duration.seconds(30),
+      layers: [backendLayer, sharedLayer],
+      memorySize: 256,
+      environment: {
+        ENVIRONMENT: stackEnv,
+        USAGE_STATS_TABLE_NAME: params.USAGE_STATS_TABLE_NAME,
       },
     });
 
@@ -92,8 +175,18 @@ export class BackendStack extends Stack {
     userQuotaTable.grantReadWriteData(uploadFunction);
     eventBus.grantPutEventsTo(uploadFunction);
     pdfsTable.grantReadWriteData(uploadFunction);
+    pdfBucket.grantPut(batchUploadFunction);
+    pdfBucket.grantDelete(batchUploadFunction);
+    userQuotaTable.grantReadWriteData(batchUploadFunction);
+    eventBus.grantPutEventsTo(batchUploadFunction);
+    pdfsTable.grantReadWriteData(batchUploadFunction);
     pdfsTable.grantReadData(getUserPdfsFunction);
+    userQuotaTable.grantReadData(getUserPdfsFunction);
     processedBucket.grantRead(getUserPdfsFunction);
+    userQuotaTable.grantReadData(getUserStatsFunction);
+    userQuotaTable.grantReadWriteData(reconcileUserStatsFunction);
+    pdfsTable.grantReadData(reconcileUserStatsFunction);
+    usageStatsTable.grantReadData(getUsageStatsFunction);
 
     // === STRIPE INTEGRATION ===
     
@@ -157,6 +250,8 @@ export class BackendStack extends Stack {
       deployOptions: {
         stageName: stackEnv,
       },
+      // Gzip/deflate responses above 1 KiB for clients sending Accept-Encoding (large listings)
+      minCompressionSize: Size.kibibytes(1),
       defaultCorsPreflightOptions: {
         allowOrigins: apigateway.Cors.ALL_ORIGINS,
         allowMethods: apigateway.Cors.ALL_METHODS,
@@ -166,6 +261,7 @@ export class BackendStack extends Stack {
           'Authorization',
           'X-Api-Key',
           'X-Amz-Security-Token',
+          'If-None-Match',
         ],
         allowCredentials: true,
       },
@@ -186,6 +282,13 @@ export class BackendStack extends Stack {
       authorizationType: apigateway.AuthorizationType.COGNITO,
     });
 
+    // Batch upload endpoint (protected with Cognito) - several PDFs per request
+    const batchUploadResource = uploadResource.addResource('batch');
+    batchUploadResource.addMethod('POST', new apigateway.LambdaIntegration(batchUploadFunction), {
+      authorizer,
+      authorizationType: apigateway.AuthorizationType.COGNITO,
+    });
+
     // Processed PDFs endpoint (protected with Cognito) - returns list + presigned download links
     const processedResource = api.root.addResource('processed');
     processedResource.addMethod('GET', new apigateway.LambdaIntegration(getUserPdfsFunction), {
@@ -193,6 +296,19 @@ export class BackendStack extends Stack {
       authorizationType: apigateway.AuthorizationType.COGNITO,
     });
 
+    // Usage stats endpoint (protected with Cognito)
+    const statsResource = api.root.addResource('stats');
+    statsResource.addMethod('GET', new apigateway.LambdaIntegration(getUserStatsFunction), {
+      authorizer,
+      authorizationType: apigateway.AuthorizationType.COGNITO,
+    });
+
+    // Model usage endpoint (IAM auth - for internal capacity planning, not end users)
+    const usageResource = api.root.addResource('usage');
+    usageResource.addMethod('GET', new apigateway.LambdaIntegration(getUsageStatsFunction), {
+      authorizationType: apigateway.AuthorizationType.IAM,
+    });
+
     // === STRIPE ENDPOINTS ===
     
     // Create checkout session (protected - user must be logged in)
@@ -6,11 +6,14 @@ import * as iam from 'aws-cdk-lib/aws-iam';
 import * as sqs from 'aws-cdk-lib/aws-sqs';
 import * as events from 'aws-cdk-lib/aws-events';
 import * as targets from 'aws-cdk-lib/aws-events-targets';
+import * as lambdaEventSources from 'aws-cdk-lib/aws-lambda-event-sources';
+import * as fs from 'fs';
 import * as path from 'path';
 import { Construct } from 'constructs';
 import { createStackParameters, getSsmParameters } from './parameters';
 
 const ssmParams = {
+  USER_QUOTA_TABLE_NAME: 'USER_QUOTA_TABLE_NAME',
 };
 
 export class DataStack extends Stack {
@@ -19,6 +22,8 @@ export class DataStack extends Stack {
 
     const params = getSsmParameters(this, stackEnv, ssmParams);
 
+    const userQuotaTable = dynamodb.TableV2.fromTableName(this, 'ImportedUserQuotaTable', params.USER_QUOTA_TABLE_NAME);
+
     // S3 Bucket for PDF storage with lifecycle rules
     const pdfBucket = new s3.Bucket(this, 'PdfBucket', {
       bucketName: `pdf-analyzer-uploads-${stackEnv}-${this.account}`,
@@ -60,6 +65,14 @@ export class DataStack extends Stack {
       removalPolicy: stackEnv === 'production' ? RemovalPolicy.RETAIN : RemovalPolicy.DESTROY,
     });
 
+    // Rolled-up model usage (tokens, latency, cost) per model and per config version
+    const usageStatsTable = new dynamodb.TableV2(this, 'UsageStatsTable', {
+      tableName: `pdf-analyzer-usage-stats-${stackEnv}`,
+      partitionKey: { name: 'id', type: dynamodb.AttributeType.STRING },
+      billing: dynamodb.Billing.onDemand(),
+      removalPolicy: stackEnv === 'production' ? RemovalPolicy.RETAIN : RemovalPolicy.DESTROY,
+    });
+
     // Processed PDF bucket
     const processedBucket = new s3.Bucket(this, 'ProcessedPdfBucket', {
       bucketName: `pdf-analyzer-processed-${stackEnv}-${this.account}`,
@@ -93,6 +106,25 @@ export class DataStack extends Stack {
       description: 'Layer with numpy and python-dotenv for data processing',
     });
 
+    // Layer with modules shared by the backend and data Lambdas (src/shared/python -> /opt/python)
+    const sharedLayer = new lambda.LayerVersion(this, 'SharedLayer', {
+      layerVersionName: `pdf-analyzer-data-shared-layer-${stackEnv}`,
+      code: lambda.Code.fromAsset(path.join(__dirname, '../../src/shared')),
+      compatibleRuntimes: [lambda.Runtime.PYTHON_3_13],
+      description: 'Shared modules (DynamoDB codec) for data processing',
+    });
+
+    // Priority lanes: paid and free uploads are queued separately so a free-tier burst
+    // cannot delay paying subscribers. Each lane caps how many processors it may occupy.
+    // Shared with the processor, see src/shared/python/processing_lanes.py
+    const lanes: { name: string, id: string, maxConcurrency: number, default?: boolean }[] = JSON.parse(
+      fs.readFileSync(path.join(__dirname, '../../src/shared/python/processing_lanes.json'), 'utf-8'),
+    );
+
+    // maxConcurrency only caps each lane; reserving their sum guarantees the lanes can
+    // always reach their caps instead of competing with the rest of the account
+    const laneConcurrency = lanes.reduce((total, lane) => total + lane.maxConcurrency, 0);
+
     // Data processor Lambda function
     const dataProcessorFunction = new lambda.Function(this, 'DataProcessorFunction', {
       functionName: `pdf-analyzer-data-processor-${stackEnv}`,
@@ -101,15 +133,18 @@ export class DataStack extends Stack {
       code: lambda.Code.fromAsset(path.join(__dirname, '../../src/data'), {
         exclude: ['requirements.txt'],
       }),
-      layers: [dataLayer],
+      layers: [dataLayer, sharedLayer],
       timeout: Duration.seconds(60),
       memorySize: 512,
+      reservedConcurrentExecutions: laneConcurrency,
       environment: {
         ENVIRONMENT: stackEnv,
         RAW_PDF_BUCKET_NAME: pdfBucket.bucketName,
         PROCESSED_PDF_BUCKET_NAME: processedBucket.bucketName,
         PDFS_TABLE_NAME: pdfsTable.tableName,
         CONFIGS_TABLE_NAME: configsTable.tableName,
+        USER_QUOTA_TABLE_NAME: params.USER_QUOTA_TABLE_NAME,
+        USAGE_STATS_TABLE_NAME: usageStatsTable.tableName,
       },
     });
 
@@ -118,6 +153,8 @@ export class DataStack extends Stack {
     processedBucket.grantWrite(dataProcessorFunction);
     pdfsTable.grantReadWriteData(dataProcessorFunction);
     configsTable.grantReadData(dataProcessorFunction);
+    userQuotaTable.grantReadWriteData(dataProcessorFunction);
+    usageStatsTable.grantReadWriteData(dataProcessorFunction);
 
     // Allow invoking Bedrock models from this Lambda
     dataProcessorFunction.addToRolePolicy(new iam.PolicyStatement({
@@ -129,11 +166,30 @@ export class DataStack extends Stack {
       ],
     }));
 
-    // EventBridge rule to trigger processor
-    new events.Rule(this, 'PdfUploadedRule', {
-      eventBus: uploadEventBus,
-      eventPattern: { source: ['pdf-analyzer'], detailType: ['PDF_UPLOADED'] },
-      targets: [new targets.LambdaFunction(dataProcessorFunction, { deadLetterQueue: dlq })],
+    lanes.forEach((lane) => {
+      const laneQueue = new sqs.Queue(this, `Pdf${lane.id}LaneQueue`, {
+        queueName: `pdf-analyzer-${lane.name}-lane-${stackEnv}`,
+        // Must exceed the processor timeout so in-flight messages are not redelivered
+        visibilityTimeout: Duration.seconds(360),
+        deadLetterQueue: { queue: dlq, maxReceiveCount: 3 },
+      });
+
+      // The default lane also takes events without a lane (in flight during a deploy, or
+      // replayed), which the processor treats as that lane, so no upload is dropped
+      const otherLanes = lanes.filter((other) => other.name !== lane.name).map((other) => other.name);
+      const lanePattern = lane.default ? [{ 'anything-but': otherLanes }, { exists: false }] : [lane.name];
+
+      // EventBridge rule to route uploads of this lane to its queue
+      new events.Rule(this, `PdfUploaded${lane.id}Rule`, {
+        eventBus: uploadEventBus,
+        eventPattern: { source: ['pdf-analyzer'], detailType: ['PDF_UPLOADED'], detail: { lane: lanePattern } },
+        targets: [new targets.SqsQueue(laneQueue, { deadLetterQueue: dlq })],
+      });
+
+      dataProcessorFunction.addEventSource(new lambdaEventSources.SqsEventSource(laneQueue, {
+        batchSize: 1,
+        maxConcurrency: lane.maxConcurrency,
+      }));
     });
 
     createStackParameters(this, stackEnv, {
@@ -141,6 +197,7 @@ export class DataStack extends Stack {
       PROCESSED_PDF_BUCKET_NAME: processedBucket.bucketName,
       PDFS_TABLE_NAME: pdfsTable.tableName,
       UPLOAD_EVENT_BUS_NAME: uploadEventBus.eventBusName,
+      USAGE_STATS_TABLE_NAME: usageStatsTable.tableName,
     });
   }
 }
@@ -0,0 +1,99 @@
+"""Return rolled-up model usage (tokens, latency, cost) per model and per config version.
+
+Internal endpoint protected with IAM auth. Optional query parameters `model` and
+`configVersion` select single rollups; without them every rollup is returned.
+"""
+import json
+import os
+
+import boto3
+from dotenv import load_dotenv
+from dynamo_codec import deserialize_item, deserialize_items
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=False)
+
+
+dynamodb = boto3.client('dynamodb')
+
+USAGE_STATS_TABLE_NAME = os.environ.get('USAGE_STATS_TABLE_NAME', '')
+
+
+CORS_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    "Access-Control-Allow-Methods": "GET,OPTIONS",
+}
+
+
+def _response(status_code: int, body_obj: object):
+    return {
+        "statusCode": status_code,
+        "headers": CORS_HEADERS,
+        "body": json.dumps(body_obj),
+    }
+
+
+def _summarize(item: dict) -> dict:
+    documents = int(item.get('documents', 0))
+    input_tokens = int(item.get('inputTokens', 0))
+    output_tokens = int(item.get('outputTokens', 0))
+    latency_ms_total = int(item.get('latencyMsTotal', 0))
+    cost_usd = float(item.get('costUsd', 0))
+    per_document = max(documents, 1)
+    return {
+        "documents": documents,
+        "inputTokens": input_tokens,
+        "outputTokens": output_tokens,
+        "costUsd": round(cost_usd, 6),
+        "avgInputTokens": round(input_tokens / per_document, 1),
+        "avgOutputTokens": round(output_tokens / per_document, 1),
+        "avgLatencyMs": round(latency_ms_total / per_document, 1),
+        "avgCostUsd": round(cost_usd / per_document, 6),
+        "updatedAt": item.get('updatedAt'),
+    }
+
+
+def handler(event, context):
+    print(json.dumps(event))
+
+    if not USAGE_STATS_TABLE_NAME:
+        return _response(500, {"error": "USAGE_STATS_TABLE_NAME is not configured"})
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {"statusCode": 200, "headers": CORS_HEADERS, "body": ""}
+
+    params = event.get('queryStringParameters') or {}
+
+    try:
+        rollup_ids = []
+        if params.get('model'):
+            rollup_ids.append(f"model#{params['model']}")
+        if params.get('configVersion'):
+            rollup_ids.append(f"config#{params['configVersion']}")
+
+        if rollup_ids:
+            items = [
+                deserialize_item(dynamodb.get_item(TableName=USAGE_STATS_TABLE_NAME, Key={'id': {'S': rollup_id}}).get('Item'))
+                for rollup_id in rollup_ids
+            ]
+            items = [item for item in items if item]
+        else:
+            # The rollup table holds one row per model and config version, so a scan stays small
+            items = []
+            for page in dynamodb.get_paginator('scan').paginate(TableName=USAGE_STATS_TABLE_NAME):
+                items.extend(deserialize_items(page.get('Items', [])))
+    except Exception as e:
+        print('DynamoDB read failed:', e)
+        return _response(500, {"error": "Failed to read usage stats"})
+
+    models = {}
+    config_versions = {}
+    for item in items:
+        kind, _, name = item['id'].partition('#')
+        if kind == 'model':
+            models[name] = _summarize(item)
+        elif kind == 'config':
+            config_versions[name] = _summarize(item)
+
+    return _response(200, {"models": models, "configVersions": config_versions})
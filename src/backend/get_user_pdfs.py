@@ -3,78 +3,93 @@ import os
 from datetime import timezone, datetime
 
 import boto3
-from boto3.dynamodb.conditions import Key
-from decimal import Decimal
 from dotenv import load_dotenv
+from dynamo_codec import deserialize_item, deserialize_items
+from listing_helpers import CORS_HEADERS, compute_etag, etag_matches, response
+from usage_counters import LISTING_VERSION
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=False)
 
 
-# DynamoDB resource is used for convenient querying
-dynamodb = boto3.resource('dynamodb')
+# Low-level client: items are decoded in one pass by the shared codec
+dynamodb = boto3.client('dynamodb')
 s3 = boto3.client('s3')
 
-
-def convert_decimal(obj):
-    if isinstance(obj, list):
-        return [convert_decimal(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_decimal(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        if obj % 1 == 0:
-            return int(obj)
-        else:
-            return float(obj)
-    else:
-        return obj
-
 PROCESSED_PDF_BUCKET_NAME = os.environ.get('PROCESSED_PDF_BUCKET_NAME', '')
 PDFS_TABLE_NAME = os.environ.get('PDFS_TABLE_NAME', '')
+USER_QUOTA_TABLE_NAME = os.environ.get('USER_QUOTA_TABLE_NAME', '')
 URL_EXPIRY_SECONDS = int(os.environ.get('URL_EXPIRY_SECONDS', '900'))
 
 
-CORS_HEADERS = {
-    "Content-Type": "application/json",
-    "Access-Control-Allow-Origin": "*",
-    "Access-Control-Allow-Headers": "Content-Type,Authorization",
-    "Access-Control-Allow-Methods": "GET,OPTIONS",
-}
-
-
-def _response(status_code: int, body_obj: object):
-    return {
-        "statusCode": status_code,
-        "headers": CORS_HEADERS,
-        "body": json.dumps(body_obj),
-    }
-
-
 def _get_user_id(event) -> str | None:
     claims = event.get('requestContext', {}).get('authorizer', {}).get('claims', {})
     return claims.get('sub')
 
+
+def _get_listing_version(user_id: str) -> int | None:
+    """The user's listing version from the quota row, or None if it has none yet."""
+    if not USER_QUOTA_TABLE_NAME:
+        return None
+    try:
+        resp = dynamodb.get_item(
+            TableName=USER_QUOTA_TABLE_NAME,
+            Key={'userId': {'S': user_id}},
+            ProjectionExpression='#v',
+            ExpressionAttributeNames={'#v': LISTING_VERSION},
+        )
+    except Exception as e:
+        print('Listing version read failed:', e)
+        return None
+    return (deserialize_item(resp.get('Item')) or {}).get(LISTING_VERSION)
+
+
 def handler(event, context):
     print(json.dumps(event))
 
     if not PROCESSED_PDF_BUCKET_NAME:
-        return _response(500, {"error": "PROCESSED_PDF_BUCKET_NAME is not configured"})
+        return response(500, {"error": "PROCESSED_PDF_BUCKET_NAME is not configured"})
 
     if event.get('httpMethod') == 'OPTIONS':
         return {"statusCode": 200, "headers": CORS_HEADERS, "body": ""}
 
     user_id = _get_user_id(event)
     if not user_id:
-        return _response(401, {"error": "Unauthorized"})
+        return response(401, {"error": "Unauthorized"})
+
+    # Unchanged polls are answered from one GetItem, without querying the PDFs
+    version = _get_listing_version(user_id)
+    etag = None
+    if version is not None:
+        etag = compute_etag([(user_id, version)], URL_EXPIRY_SECONDS)
+        if etag_matches(event, etag):
+            return response(304, None, etag)
 
     # Query DynamoDB for all PDFs for this user
-    table = dynamodb.Table(PDFS_TABLE_NAME)
+    items = []
     try:
-        resp = table.query(KeyConditionExpression=Key('user_id').eq(user_id))
+        paginator = dynamodb.get_paginator('query')
+        for page in paginator.paginate(
+            TableName=PDFS_TABLE_NAME,
+            KeyConditionExpression='user_id = :uid',
+            ExpressionAttributeValues={':uid': {'S': user_id}},
+            # The rows must be at least as new as the version the ETag is built from
+            ConsistentRead=True,
+        ):
+            items.extend(deserialize_items(page.get('Items', [])))
     except Exception as e:
         print('DynamoDB query failed:', e)
-        return _response(500, {"error": "Failed to query PDFs table"})
-
-    items = convert_decimal(resp.get('Items', []))
+        return response(500, {"error": "Failed to query PDFs table"})
+
+    if etag is None:
+        # Quota rows written before the listing version existed: hash the listing itself
+        etag = compute_etag(
+            ((item.get('pdf_id'), item.get('status'), item.get('filename'), item.get('uploaded_at'),
+              item.get('processed_at'), item.get('processed_s3_uri'))
+             for item in sorted(items, key=lambda i: i.get('pdf_id') or '')),
+            URL_EXPIRY_SECONDS,
+        )
+        if etag_matches(event, etag):
+            return response(304, None, etag)
 
     files = []
     for item in items:
@@ -122,4 +137,4 @@ def handler(event, context):
     # Sort by uploadedAt (ISO string) descending
     files = sorted(files, key=lambda f: f.get('uploadedAt') or '', reverse=True)
 
-    return _response(200, {"files": files})
+    return response(200, {"files": files}, etag)
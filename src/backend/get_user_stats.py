@@ -0,0 +1,73 @@
+"""Return a user's usage totals from the counters kept on the quota table."""
+import json
+import os
+
+import boto3
+from dotenv import load_dotenv
+from dynamo_codec import deserialize_item
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=False)
+
+
+dynamodb = boto3.client('dynamodb')
+
+USER_QUOTA_TABLE_NAME = os.environ.get('USER_QUOTA_TABLE_NAME', '')
+
+
+CORS_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    "Access-Control-Allow-Methods": "GET,OPTIONS",
+}
+
+
+def _response(status_code: int, body_obj: object):
+    return {
+        "statusCode": status_code,
+        "headers": CORS_HEADERS,
+        "body": json.dumps(body_obj),
+    }
+
+
+def _get_user_id(event) -> str | None:
+    claims = event.get('requestContext', {}).get('authorizer', {}).get('claims', {})
+    return claims.get('sub')
+
+
+def handler(event, context):
+    print(json.dumps(event))
+
+    if not USER_QUOTA_TABLE_NAME:
+        return _response(500, {"error": "USER_QUOTA_TABLE_NAME is not configured"})
+
+    if event.get('httpMethod') == 'OPTIONS':
+        return {"statusCode": 200, "headers": CORS_HEADERS, "body": ""}
+
+    user_id = _get_user_id(event)
+    if not user_id:
+        return _response(401, {"error": "Unauthorized"})
+
+    # Counters are maintained at each status transition by upload.py and the data processor,
+    # so this is a single key lookup regardless of how many PDFs the user has.
+    try:
+        resp = dynamodb.get_item(TableName=USER_QUOTA_TABLE_NAME, Key={'userId': {'S': user_id}})
+        item = deserialize_item(resp.get('Item')) or {}
+    except Exception as e:
+        print('DynamoDB get_item failed:', e)
+        return _response(500, {"error": "Failed to read usage stats"})
+
+    return _response(200, {
+        "documents": {
+            "total": item.get('docsTotal', 0),
+            "uploaded": item.get('docsUploaded', 0),
+            "processing": item.get('docsProcessing', 0),
+            "completed": item.get('docsCompleted', 0),
+            "failed": item.get('docsFailed', 0),
+        },
+        "bytesUploaded": item.get('bytesUploaded', 0),
+        "bytesProcessed": item.get('bytesProcessed', 0),
+        "lastActivityAt": item.get('lastActivityAt'),
+        "uploadCount": item.get('uploadCount', 0),
+        "uploadLimit": item.get('uploadLimit', 0),
+    })
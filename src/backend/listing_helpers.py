@@ -0,0 +1,52 @@
+"""Response and conditional-GET helpers shared by the listing endpoints
+(get_user_pdfs, get_processed_pdfs)."""
+import hashlib
+import json
+import time
+
+
+CORS_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization,If-None-Match",
+    "Access-Control-Allow-Methods": "GET,OPTIONS",
+    "Access-Control-Expose-Headers": "ETag",
+}
+
+
+def response(status_code: int, body_obj: object, etag: str | None = None):
+    headers = CORS_HEADERS
+    if etag:
+        headers = {**CORS_HEADERS, "ETag": etag, "Cache-Control": "private, no-cache"}
+    return {
+        "statusCode": status_code,
+        "headers": headers,
+        "body": json.dumps(body_obj) if body_obj is not None else "",
+    }
+
+
+def get_header(event, name: str) -> str | None:
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for k, v in headers.items():
+        if k.lower() == name:
+            return v
+    return None
+
+
+def compute_etag(version_parts, url_expiry_seconds: int) -> str:
+    """Weak ETag over the fields that change the listing. Presigned URLs differ on every
+    call, so the token also rolls over every half URL lifetime to keep cached links valid."""
+    digest = hashlib.sha1()
+    digest.update(str(int(time.time()) // max(1, url_expiry_seconds // 2)).encode())
+    for part in version_parts:
+        digest.update(json.dumps(part, default=str).encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def etag_matches(event, etag: str) -> bool:
+    if_none_match = get_header(event, 'If-None-Match')
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or etag[2:] in candidates
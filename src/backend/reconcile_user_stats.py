@@ -0,0 +1,136 @@
+"""Rebuild per-user usage counters on the quota table from the PDFs table rows.
+
+Runs on a schedule to repair drift in the incrementally maintained counters. Pass
+{"userId": "..."} to reconcile a single user instead of scanning the whole table.
+
+upload.py and the data processor write every PDF row that adds or changes a status in
+the same transaction as the matching counter update, which also sets lastActivityAt.
+The job snapshots lastActivityAt before reading the PDFs table and only writes a user's
+totals if it is unchanged. A transition committed before the snapshot is in both the
+rows and the counters; one committed after it changes lastActivityAt, so that user is
+skipped and repaired on the next run. Users without a quota row are skipped as well;
+users with a quota row but no PDFs are reset to zero.
+"""
+import json
+import os
+
+import boto3
+from dotenv import load_dotenv
+from botocore.exceptions import ClientError
+from dynamo_codec import deserialize_items
+from usage_counters import STATUS_COUNTERS
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=False)
+
+
+dynamodb = boto3.resource('dynamodb')
+dynamodb_client = boto3.client('dynamodb')
+
+PDFS_TABLE_NAME = os.environ.get('PDFS_TABLE_NAME', '')
+USER_QUOTA_TABLE_NAME = os.environ.get('USER_QUOTA_TABLE_NAME', '')
+
+PROJECTION = 'user_id, #s, size_bytes, uploaded_at, processed_at'
+
+
+def _empty_totals() -> dict:
+    totals = {counter: 0 for counter in STATUS_COUNTERS.values()}
+    totals.update({'docsTotal': 0, 'bytesUploaded': 0, 'bytesProcessed': 0, 'lastActivityAt': None})
+    return totals
+
+
+def _add_row(totals: dict, row: dict) -> None:
+    size = row.get('size_bytes', 0)
+    totals['docsTotal'] += 1
+    totals['bytesUploaded'] += size
+    status = row.get('status')
+    if status in STATUS_COUNTERS:
+        totals[STATUS_COUNTERS[status]] += 1
+    if status == 'processing completed':
+        totals['bytesProcessed'] += size
+    for timestamp in (row.get('uploaded_at'), row.get('processed_at')):
+        if timestamp and (totals['lastActivityAt'] is None or timestamp > totals['lastActivityAt']):
+            totals['lastActivityAt'] = timestamp
+
+
+def _rows(table_name: str, operation: str, **kwargs):
+    for page in dynamodb_client.get_paginator(operation).paginate(TableName=table_name, **kwargs):
+        yield from deserialize_items(page.get('Items', []))
+
+
+def _activity_snapshot(user_id: str | None) -> dict[str, str | None]:
+    """lastActivityAt per existing quota row, read before the PDFs table."""
+    if user_id:
+        resp = dynamodb_client.get_item(TableName=USER_QUOTA_TABLE_NAME, Key={'userId': {'S': user_id}},
+                                        ProjectionExpression='userId, lastActivityAt', ConsistentRead=True)
+        rows = deserialize_items([resp['Item']]) if 'Item' in resp else []
+    else:
+        rows = _rows(USER_QUOTA_TABLE_NAME, 'scan', ProjectionExpression='userId, lastActivityAt', ConsistentRead=True)
+    return {row['userId']: row.get('lastActivityAt') for row in rows}
+
+
+def _write_totals(user_id: str, totals: dict, seen_activity: str | None) -> bool:
+    names = {'#last': 'lastActivityAt'}
+    values = {}
+    assignments = []
+    for i, (attribute, value) in enumerate(totals.items()):
+        if value is None:
+            continue
+        names[f'#a{i}'] = attribute
+        values[f':v{i}'] = value
+        assignments.append(f'#a{i} = :v{i}')
+
+    condition = 'attribute_exists(userId) AND '
+    if seen_activity is None:
+        condition += 'attribute_not_exists(#last)'
+    else:
+        condition += '#last = :seen'
+        values[':seen'] = seen_activity
+
+    try:
+        dynamodb.Table(USER_QUOTA_TABLE_NAME).update_item(
+            Key={'userId': user_id},
+            UpdateExpression='SET ' + ', '.join(assignments),
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        print(f"Skipping {user_id}: usage changed during reconciliation")
+        return False
+    return True
+
+
+def handler(event, context):
+    print(json.dumps(event))
+
+    user_id = (event or {}).get('userId')
+
+    activity = _activity_snapshot(user_id)
+
+    # Every quota row gets totals, so drifted counters of users without PDFs are reset too
+    totals_by_user: dict[str, dict] = {uid: _empty_totals() for uid in activity}
+    if user_id:
+        rows = _rows(PDFS_TABLE_NAME, 'query', KeyConditionExpression='user_id = :uid', ExpressionAttributeValues={':uid': {'S': user_id}},
+                     ProjectionExpression=PROJECTION, ExpressionAttributeNames={'#s': 'status'})
+    else:
+        rows = _rows(PDFS_TABLE_NAME, 'scan', ProjectionExpression=PROJECTION, ExpressionAttributeNames={'#s': 'status'})
+
+    for row in rows:
+        _add_row(totals_by_user.setdefault(row['user_id'], _empty_totals()), row)
+
+    reconciled = 0
+    skipped = 0
+    for uid, totals in totals_by_user.items():
+        if uid not in activity:
+            skipped += 1
+            continue
+        if _write_totals(uid, totals, activity[uid]):
+            reconciled += 1
+        else:
+            skipped += 1
+
+    result = {"reconciledUsers": reconciled, "skippedUsers": skipped}
+    print(json.dumps(result))
+    return result
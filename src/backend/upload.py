@@ -3,15 +3,22 @@ import json
 import os
 import uuid
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import boto3
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeSerializer
 from dotenv import load_dotenv
+from dynamo_codec import deserialize_item
+from usage_counters import LISTING_VERSION
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=False)
 
 s3 = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
+dynamodb_client = boto3.client('dynamodb')
 events = boto3.client('events')
+serializer = TypeSerializer()
 
 RAW_PDF_BUCKET_NAME = os.environ['RAW_PDF_BUCKET_NAME']
 USER_QUOTA_TABLE_NAME = os.environ['USER_QUOTA_TABLE_NAME']
@@ -19,6 +26,16 @@ NEW_USER_QUOTA = int(os.environ.get('NEW_USER_QUOTA', '10'))
 UPLOAD_EVENT_BUS_NAME = os.environ['UPLOAD_EVENT_BUS_NAME']
 PDFS_TABLE_NAME = os.environ['PDFS_TABLE_NAME']
 
+# Processing lane per subscription tier (routed by the PdfUploaded rules in the data stack)
+TIER_LANES = {'paid': 'priority', 'free': 'standard'}
+
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', '50'))
+EVENTS_PER_PUT = 10  # EventBridge PutEvents limit
+# Per-file errors caused by the request itself; any other error is a server-side failure
+CLIENT_ERRORS = {"No file provided", "Quota exceeded"}
+ROWS_PER_TRANSACTION = 99  # TransactWriteItems takes 100 actions, one is the counter update
+S3_UPLOAD_WORKERS = 8
+
 CORS_HEADERS = {
     "Content-Type": "application/json",
     "Access-Control-Allow-Origin": "*",
@@ -26,24 +43,179 @@ CORS_HEADERS = {
     "Access-Control-Allow-Methods": "POST,OPTIONS",
 }
 
-def put_dynamo_item(table_name: str, item: dict) -> None:
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table(table_name)
-    table.put_item(Item=item)
+def get_user_tier(quota_item: dict) -> str:
+    """Users with an active Stripe subscription (see stripe_handler.update_user_quota) are paid."""
+    return 'paid' if quota_item.get('subscriptionId') else 'free'
+
 
 def check_quota(user_id):
-    """Check/create quota. Returns (allowed, remaining)."""
+    """Check/create quota. Returns (allowed, remaining, tier)."""
     table = dynamodb.Table(USER_QUOTA_TABLE_NAME)
-    resp = table.get_item(Key={'userId': user_id})
+    resp = dynamodb_client.get_item(TableName=USER_QUOTA_TABLE_NAME, Key={'userId': {'S': user_id}})
     
     if 'Item' not in resp:
         now = datetime.now(timezone.utc).isoformat()
         table.put_item(Item={'userId': user_id, 'uploadCount': 0, 'uploadLimit': NEW_USER_QUOTA, 'createdAt': now})
-        return True, NEW_USER_QUOTA
+        return True, NEW_USER_QUOTA, 'free'
     
-    item = resp['Item']
+    item = deserialize_item(resp['Item'])
     remaining = int(item.get('uploadLimit', 10)) - int(item.get('uploadCount', 0))
-    return remaining > 0, max(0, remaining)
+    return remaining > 0, max(0, remaining), get_user_tier(item)
+
+
+def reserve_quota(user_id, requested, attempts=3):
+    """Reserve up to `requested` upload slots in one conditional write. Returns (granted, tier)."""
+    table = dynamodb.Table(USER_QUOTA_TABLE_NAME)
+    for _ in range(attempts):
+        item = deserialize_item(dynamodb_client.get_item(
+            TableName=USER_QUOTA_TABLE_NAME, Key={'userId': {'S': user_id}}, ConsistentRead=True
+        ).get('Item'))
+        if item is None:
+            count, limit, tier = 0, NEW_USER_QUOTA, 'free'
+            update = {
+                'UpdateExpression': 'SET uploadCount = :new, uploadLimit = :limit, createdAt = :now',
+                'ConditionExpression': 'attribute_not_exists(userId)',
+                'ExpressionAttributeValues': {':limit': limit, ':now': datetime.now(timezone.utc).isoformat()},
+            }
+        else:
+            count, limit, tier = int(item.get('uploadCount', 0)), int(item.get('uploadLimit', 10)), get_user_tier(item)
+            # Optimistic lock on the count we read, so concurrent uploads cannot overshoot the limit
+            update = {
+                'UpdateExpression': 'SET uploadCount = :new',
+                'ConditionExpression': 'uploadCount = :old',
+                'ExpressionAttributeValues': {':old': count},
+            }
+
+        granted = min(requested, max(0, limit - count))
+        if granted == 0:
+            return 0, tier
+        update['ExpressionAttributeValues'][':new'] = count + granted
+        try:
+            table.update_item(Key={'userId': user_id}, **update)
+            return granted, tier
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+    raise RuntimeError("Could not reserve upload quota due to concurrent uploads, please retry")
+
+
+def build_usage_update(user_id, uploaded=0, failed=0, size_bytes=0, released_slots=0):
+    """Low-level update of the per-user usage counters (see get_user_stats) that also gives back
+    slots reserved for files that did not make it through.
+
+    Commit it in the same transaction as the PDF rows it counts, so reconcile_user_stats
+    never sees the rows and the counters disagree.
+    """
+    return {
+        'TableName': USER_QUOTA_TABLE_NAME,
+        'Key': {'userId': {'S': user_id}},
+        'UpdateExpression': 'SET lastActivityAt = :now ADD uploadCount :released, docsTotal :total, '
+                            'docsUploaded :uploaded, docsFailed :failed, bytesUploaded :bytes, #version :one',
+        'ExpressionAttributeNames': {'#version': LISTING_VERSION},
+        'ExpressionAttributeValues': {k: serializer.serialize(v) for k, v in {
+            ':now': datetime.now(timezone.utc).isoformat(),
+            ':released': -released_slots,
+            ':total': uploaded + failed,
+            ':uploaded': uploaded,
+            ':failed': failed,
+            ':bytes': size_bytes,
+            ':one': 1,
+        }.items()},
+    }
+
+
+def release_slots(user_id, released_slots):
+    """Give back reserved slots when no PDF row was written for them."""
+    dynamodb_client.update_item(**build_usage_update(user_id, released_slots=released_slots))
+
+
+def write_uploads(user_id, stored, released_slots=0):
+    """Write the metadata rows of stored files together with their usage counters.
+
+    Each transaction is all-or-nothing; files in a chunk that failed get an error and are
+    returned so the caller can discard them and release their slots.
+    """
+    failed = []
+    for start in range(0, len(stored), ROWS_PER_TRANSACTION):
+        chunk = stored[start:start + ROWS_PER_TRANSACTION]
+        puts = [
+            {'Put': {'TableName': PDFS_TABLE_NAME, 'Item': {k: serializer.serialize(v) for k, v in build_pdf_item(
+                user_id, r["fileId"], r["filename"], r["key"], r["size"]).items()}}}
+            for r in chunk
+        ]
+        usage = build_usage_update(user_id, uploaded=len(chunk), size_bytes=sum(r["size"] for r in chunk),
+                                   released_slots=released_slots if start == 0 else 0)
+        try:
+            dynamodb_client.transact_write_items(TransactItems=[*puts, {'Update': usage}])
+        except Exception as e:
+            print(f"Metadata write failed for batch: {e}")
+            for result in chunk:
+                result["error"] = f"Metadata write failed: {e}"
+            failed.extend(chunk)
+            release_slots(user_id, len(chunk) + (released_slots if start == 0 else 0))
+    return failed
+
+
+def fail_unpublished(user_id, unpublished):
+    """Move files whose event was not published from 'uploaded' to 'processing failed',
+    rows and counters together, and give back their slots."""
+    for start in range(0, len(unpublished), ROWS_PER_TRANSACTION):
+        chunk = unpublished[start:start + ROWS_PER_TRANSACTION]
+        updates = [
+            {'Update': {
+                'TableName': PDFS_TABLE_NAME,
+                'Key': {'user_id': {'S': user_id}, 'pdf_id': {'S': r["fileId"]}},
+                'UpdateExpression': 'SET #s = :failed, error_message = :err',
+                'ConditionExpression': '#s = :uploaded',
+                'ExpressionAttributeNames': {'#s': 'status'},
+                'ExpressionAttributeValues': {':failed': {'S': 'processing failed'}, ':uploaded': {'S': 'uploaded'},
+                                              ':err': {'S': r["error"]}},
+            }}
+            for r in chunk
+        ]
+        usage = build_usage_update(user_id, uploaded=-len(chunk), failed=len(chunk), released_slots=len(chunk))
+        try:
+            dynamodb_client.transact_write_items(TransactItems=[*updates, {'Update': usage}])
+        except Exception as e:
+            print(f"Failed to mark unpublished uploads as failed: {e}")
+            release_slots(user_id, len(chunk))
+
+
+def discard_uploads(results):
+    """Best-effort removal of the raw objects of files whose metadata was never written."""
+    if not results:
+        return
+    try:
+        s3.delete_objects(Bucket=RAW_PDF_BUCKET_NAME, Delete={'Objects': [{'Key': r["key"]} for r in results], 'Quiet': True})
+    except Exception as e:
+        print(f"Failed to delete raw objects of failed uploads: {e}")
+
+
+def build_pdf_item(user_id, file_id, filename, key, size_bytes):
+    return {
+        'user_id': user_id,
+        'pdf_id': file_id,
+        'status': 'uploaded',
+        'filename': filename,
+        'uploaded_at': datetime.now(timezone.utc).isoformat(),
+        'raw_s3_uri': f's3://{RAW_PDF_BUCKET_NAME}/{key}',
+        'size_bytes': size_bytes,
+    }
+
+
+def build_upload_event(user_id, file_id, filename, key, tier):
+    return {
+        'Source': 'pdf-analyzer',
+        'DetailType': 'PDF_UPLOADED',
+        'EventBusName': UPLOAD_EVENT_BUS_NAME,
+        'Detail': json.dumps({'bucket': RAW_PDF_BUCKET_NAME, 'key': key, 'userId': user_id, 'fileId': file_id, 'filename': filename, 'tier': tier, 'lane': TIER_LANES[tier]}),
+    }
+
+
+def build_raw_key(user_id, file_id):
+    # Build S3 key: user_id/year/month/day/file_id.pdf
+    now = datetime.now(timezone.utc)
+    return f"{user_id}/{now.year}/{now.month:02d}/{now.day:02d}/{file_id}.pdf"
 
 
 def handler(event, context):
@@ -53,7 +225,7 @@ def handler(event, context):
         if not user_id:
             return {"statusCode": 401, "headers": CORS_HEADERS, "body": json.dumps({"error": "Unauthorized"})}
 
-        allowed, remaining = check_quota(user_id)
+        allowed, remaining, tier = check_quota(user_id)
         if not allowed:
             return {"statusCode": 403, "headers": CORS_HEADERS, "body": json.dumps({"error": "Quota exceeded", "remaining": remaining})}
 
@@ -64,37 +236,128 @@ def handler(event, context):
         if not file_data:
             return {"statusCode": 400, "headers": CORS_HEADERS, "body": json.dumps({"error": "No file provided"})}
 
-        # Build S3 key: user_id/year/month/day/file_id.pdf
-        now = datetime.now(timezone.utc)
         file_id = str(uuid.uuid4())
-        key = f"{user_id}/{now.year}/{now.month:02d}/{now.day:02d}/{file_id}.pdf"
+        key = build_raw_key(user_id, file_id)
 
         s3.put_object(Bucket=RAW_PDF_BUCKET_NAME, Key=key, Body=file_data, ContentType='application/pdf')
         
-        put_dynamo_item(PDFS_TABLE_NAME, {
-            'user_id': user_id,
-            'pdf_id': file_id,
-            'status': 'uploaded',
-            'filename': filename,
-            'uploaded_at': datetime.now(timezone.utc).isoformat(),
-            'raw_s3_uri': f's3://{RAW_PDF_BUCKET_NAME}/{key}'
-        })
-
-        # Increment quota
-        dynamodb.Table(USER_QUOTA_TABLE_NAME).update_item(
-            Key={'userId': user_id},
-            UpdateExpression='SET uploadCount = uploadCount + :inc',
-            ExpressionAttributeValues={':inc': 1}
-        )
+        # Metadata row, quota and usage counters in one transaction
+        item = build_pdf_item(user_id, file_id, filename, key, len(file_data))
+        dynamodb_client.transact_write_items(TransactItems=[
+            {'Put': {'TableName': PDFS_TABLE_NAME, 'Item': {k: serializer.serialize(v) for k, v in item.items()}}},
+            # check_quota does not reserve ahead, so the slot is taken here (a negative release)
+            {'Update': build_usage_update(user_id, uploaded=1, size_bytes=len(file_data), released_slots=-1)},
+        ])
 
         # Publish event
-        events.put_events(Entries=[{
-            'Source': 'pdf-analyzer',
-            'DetailType': 'PDF_UPLOADED',
-            'EventBusName': UPLOAD_EVENT_BUS_NAME,
-            'Detail': json.dumps({'bucket': RAW_PDF_BUCKET_NAME, 'key': key, 'userId': user_id, 'fileId': file_id, 'filename': filename}),
-        }])
+        events.put_events(Entries=[build_upload_event(user_id, file_id, filename, key, tier)])
 
         return {"statusCode": 200, "headers": CORS_HEADERS, "body": json.dumps({"message": "File uploaded successfully", "fileId": file_id})}
     except Exception as e:
         return {"statusCode": 500, "headers": CORS_HEADERS, "body": json.dumps({"error": str(e)})}
+
+
+def batch_handler(event, context):
+    """Upload several PDFs in one request: one quota reservation, batched metadata writes
+    and PutEvents calls of up to 10 entries. Returns a result per file."""
+    try:
+        claims = event.get('requestContext', {}).get('authorizer', {}).get('claims', {})
+        user_id = claims.get('sub')
+        if not user_id:
+            return {"statusCode": 401, "headers": CORS_HEADERS, "body": json.dumps({"error": "Unauthorized"})}
+
+        body = json.loads(event.get('body') or '{}')
+        files = body.get('files') or []
+        if not files:
+            return {"statusCode": 400, "headers": CORS_HEADERS, "body": json.dumps({"error": "No files provided"})}
+        if len(files) > MAX_BATCH_FILES:
+            return {"statusCode": 400, "headers": CORS_HEADERS, "body": json.dumps({"error": f"At most {MAX_BATCH_FILES} files per batch"})}
+
+        results = []
+        pending = []
+        for index, f in enumerate(files):
+            filename = f.get('filename', 'document.pdf')
+            result = {"index": index, "filename": filename}
+            results.append(result)
+            try:
+                file_data = base64.b64decode(f.get('file', ''))
+            except Exception:
+                file_data = b''
+            if not file_data:
+                result["error"] = "No file provided"
+                continue
+            pending.append((result, file_data))
+
+        granted, tier = reserve_quota(user_id, len(pending)) if pending else (0, 'free')
+        for result, _ in pending[granted:]:
+            result["error"] = "Quota exceeded"
+        pending = pending[:granted]
+
+        for result, file_data in pending:
+            result["fileId"] = str(uuid.uuid4())
+            result["key"] = build_raw_key(user_id, result["fileId"])
+            result["size"] = len(file_data)
+
+        def _put_object(entry):
+            result, file_data = entry
+            try:
+                s3.put_object(Bucket=RAW_PDF_BUCKET_NAME, Key=result["key"], Body=file_data, ContentType='application/pdf')
+            except Exception as e:
+                result["error"] = f"Upload failed: {e}"
+
+        with ThreadPoolExecutor(max_workers=S3_UPLOAD_WORKERS) as pool:
+            list(pool.map(_put_object, pending))
+
+        stored = [result for result, _ in pending if "error" not in result]
+        # Slots of files that never reached S3 are released with the first metadata write
+        released = len(pending) - len(stored)
+        if stored:
+            unwritten = write_uploads(user_id, stored, released)
+            discard_uploads(unwritten)
+            stored = [result for result in stored if "error" not in result]
+        elif released:
+            release_slots(user_id, released)
+
+        unpublished = []
+        for start in range(0, len(stored), EVENTS_PER_PUT):
+            chunk = stored[start:start + EVENTS_PER_PUT]
+            try:
+                resp = events.put_events(Entries=[build_upload_event(user_id, r["fileId"], r["filename"], r["key"], tier) for r in chunk])
+                # Entries come back in request order; failed ones carry an ErrorCode
+                for result, entry in zip(chunk, resp.get('Entries', [])):
+                    if entry.get('ErrorCode'):
+                        result["error"] = f"Event publish failed: {entry.get('ErrorMessage') or entry['ErrorCode']}"
+                        unpublished.append(result)
+            except Exception as e:
+                for result in chunk:
+                    result["error"] = f"Event publish failed: {e}"
+                    unpublished.append(result)
+
+        if unpublished:
+            fail_unpublished(user_id, unpublished)
+
+        for result in results:
+            result.pop("key", None)
+            result.pop("size", None)
+            result["success"] = "error" not in result
+
+        succeeded = sum(1 for r in results if r["success"])
+        errors = [r["error"] for r in results if not r["success"]]
+        if succeeded == len(results):
+            status_code = 200
+        elif succeeded:
+            status_code = 207
+        elif any(error not in CLIENT_ERRORS for error in errors):
+            # S3, DynamoDB or EventBridge failed: retryable, not the caller's fault
+            status_code = 502
+        elif "Quota exceeded" in errors:
+            status_code = 403
+        else:
+            status_code = 400
+        return {"statusCode": status_code, "headers": CORS_HEADERS, "body": json.dumps({
+            "uploaded": succeeded,
+            "failed": len(results) - succeeded,
+            "files": results,
+        })}
+    except Exception as e:
+        return {"statusCode": 500, "headers": CORS_HEADERS, "body": json.dumps({"error": str(e)})}
@@ -1,35 +1,28 @@
 import boto3
-from decimal import Decimal
-
-def convert_decimal(obj):
-    if isinstance(obj, list):
-        return [convert_decimal(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_decimal(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        if obj % 1 == 0:
-            return int(obj)
-        else:
-            return float(obj)
-    else:
-        return obj
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeSerializer
+from dynamo_codec import deserialize_item
+
+serializer = TypeSerializer()
+
+
+def _serialize(values: dict) -> dict:
+    return {k: serializer.serialize(v) for k, v in values.items()}
 
 
-def get_dynamo_item(table_name: str, key: dict) -> dict | None:
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table(table_name)
-    response = table.get_item(Key=key)
-    return convert_decimal(response.get('Item'))
+def get_dynamo_item(table_name: str, key: dict, consistent_read: bool = False) -> dict | None:
+    dynamodb = boto3.client('dynamodb')
+    response = dynamodb.get_item(TableName=table_name, Key=_serialize(key), ConsistentRead=consistent_read)
+    return deserialize_item(response.get('Item'))
 
 # def put_dynamo_item(table_name: str, item: dict) -> None:
 #     dynamodb = boto3.resource('dynamodb')
 #     table = dynamodb.Table(table_name)
 #     table.put_item(Item=item)
 
-def update_dynamo_item(table_name: str, key: dict, update_expression: str, expression_attribute_values: dict) -> None:
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table(table_name)
-    
+def build_dynamo_update(table_name: str, key: dict, update_expression: str, expression_attribute_values: dict,
+                       condition_expression: str | None = None) -> dict:
+    """Low-level UpdateItem arguments, usable directly or inside transact_update_items."""
     # Separate ExpressionAttributeNames and ExpressionAttributeValues
     expression_attribute_names = {}
     expression_attribute_values_clean = {}
@@ -38,15 +31,47 @@ def update_dynamo_item(table_name: str, key: dict, update_expression: str, expre
         if k.startswith('#'):
             expression_attribute_names[k] = v
         else:
-            expression_attribute_values_clean[k] = v
+            expression_attribute_values_clean[k] = serializer.serialize(v)
     
     update_kwargs = {
-        'Key': key,
+        'TableName': table_name,
+        'Key': _serialize(key),
         'UpdateExpression': update_expression,
-        'ExpressionAttributeValues': expression_attribute_values_clean
     }
+
+    if expression_attribute_values_clean:
+        update_kwargs['ExpressionAttributeValues'] = expression_attribute_values_clean
     
     if expression_attribute_names:
         update_kwargs['ExpressionAttributeNames'] = expression_attribute_names
-    
-    table.update_item(**update_kwargs)
\ No newline at end of file
+
+    if condition_expression:
+        update_kwargs['ConditionExpression'] = condition_expression
+
+    return update_kwargs
+
+
+def update_dynamo_item(table_name: str, key: dict, update_expression: str, expression_attribute_values: dict,
+                       condition_expression: str | None = None, return_values: str = 'NONE') -> dict | None:
+    dynamodb = boto3.client('dynamodb')
+    update_kwargs = build_dynamo_update(table_name, key, update_expression, expression_attribute_values, condition_expression)
+    response = dynamodb.update_item(ReturnValues=return_values, **update_kwargs)
+    return deserialize_item(response.get('Attributes'))
+
+
+def transact_update_items(updates: list[dict]) -> None:
+    """Apply updates built with build_dynamo_update all-or-nothing."""
+    dynamodb = boto3.client('dynamodb')
+    dynamodb.transact_write_items(TransactItems=[{'Update': update} for update in updates])
+
+
+def is_conditional_check_failure(error: Exception) -> bool:
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get('Error', {}).get('Code')
+    if code == 'ConditionalCheckFailedException':
+        return True
+    # A transaction reports its failed condition per item
+    return code == 'TransactionCanceledException' and any(
+        reason.get('Code') == 'ConditionalCheckFailed' for reason in error.response.get('CancellationReasons', [])
+    )
@@ -0,0 +1,22 @@
+import json
+import time
+
+
+METRICS_NAMESPACE = 'PdfAnalyzer'
+
+
+def emit_metric(name: str, value: float, unit: str = 'None', dimensions: dict | None = None) -> None:
+    """Print a CloudWatch Embedded Metric Format line so Lambda logs become metrics."""
+    dimensions = dimensions or {}
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [list(dimensions.keys())],
+                'Metrics': [{'Name': name, 'Unit': unit}],
+            }],
+        },
+        name: value,
+        **dimensions,
+    }))
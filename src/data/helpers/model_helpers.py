@@ -1,17 +1,96 @@
+import math
+from decimal import Decimal
+
 from langchain_aws import ChatBedrock
 from botocore.config import Config
 
-def get_model_from_config(processing_config: dict) -> ChatBedrock:
+# botocore's read timeout and total attempts ('standard' retry mode) when boto_config sets none
+DEFAULT_READ_TIMEOUT_SECONDS = 60
+DEFAULT_TOTAL_ATTEMPTS = 3
+
+
+def _configured_attempts(retries: dict) -> int:
+    if 'total_max_attempts' in retries:
+        return int(retries['total_max_attempts'])
+    if 'max_attempts' in retries:
+        # max_attempts counts retries only, excluding the first call
+        return int(retries['max_attempts']) + 1
+    return DEFAULT_TOTAL_ATTEMPTS
+
+
+def get_model_from_config(processing_config: dict, time_budget: float | None = None) -> ChatBedrock:
+    """Build the Bedrock chat model for a route.
+
+    time_budget, in seconds, bounds the whole call including retries: the read timeout is
+    capped at the budget and the attempts at however many full read timeouts fit in it, so
+    a call that would outlive the invocation fails while there is still time to release the lease.
+    """
     model_config = processing_config.get('model_config', {}).copy()
     model = model_config.pop('model')
-    
-    boto_config = Config(
-        **model_config.pop('boto_config')
-    )
+
+    boto_kwargs = dict(model_config.pop('boto_config'))
+    if time_budget is not None:
+        read_timeout = min(float(boto_kwargs.get('read_timeout', DEFAULT_READ_TIMEOUT_SECONDS)), time_budget)
+        retries = dict(boto_kwargs.get('retries', {}))
+        attempts = min(_configured_attempts(retries), max(1, math.floor(time_budget / read_timeout)))
+        retries.pop('max_attempts', None)
+        retries['total_max_attempts'] = attempts
+        boto_kwargs.update(read_timeout=read_timeout, retries=retries)
+    boto_config = Config(**boto_kwargs)
 
     llm_model = ChatBedrock(
         model=model,
         config=boto_config,
         **model_config
     )
-    return llm_model
\ No newline at end of file
+    return llm_model
+
+
+def _rule_matches(rule: dict, pdf_stats: dict) -> bool:
+    byte_size = pdf_stats['byte_size']
+    page_count = pdf_stats.get('page_count')
+
+    if 'min_bytes' in rule and byte_size < rule['min_bytes']:
+        return False
+    if 'max_bytes' in rule and byte_size > rule['max_bytes']:
+        return False
+    # Unknown page count (unparseable PDF) never matches a page-based condition
+    if 'min_pages' in rule and (page_count is None or page_count < rule['min_pages']):
+        return False
+    if 'max_pages' in rule and (page_count is None or page_count > rule['max_pages']):
+        return False
+    if 'has_text' in rule and bool(rule['has_text']) != pdf_stats.get('has_text'):
+        return False
+    return True
+
+
+def get_route_from_config(processing_config: dict, pdf_stats: dict) -> dict:
+    """Pick the first routing rule matching the document, falling back to the default model_config.
+
+    Each entry in processing_config['routing_rules'] has a 'name', a 'model_config' shaped like the
+    top-level one, and optional min_bytes/max_bytes/min_pages/max_pages/has_text conditions.
+    """
+    for rule in processing_config.get('routing_rules', []):
+        if _rule_matches(rule, pdf_stats):
+            return rule
+    return {'name': 'default', 'model_config': processing_config.get('model_config', {})}
+
+
+def get_usage_from_message(message) -> dict:
+    """Token usage reported by Bedrock on the raw AIMessage."""
+    usage = getattr(message, 'usage_metadata', None) or {}
+    return {
+        'input_tokens': int(usage.get('input_tokens', 0)),
+        'output_tokens': int(usage.get('output_tokens', 0)),
+        'total_tokens': int(usage.get('total_tokens', 0)),
+    }
+
+
+def get_cost_from_usage(usage: dict, pricing: dict | None) -> Decimal:
+    """Dollar cost of one invocation from per-1k-token prices, e.g.
+    processing_config['pricing'][model] = {'input_per_1k': 0.003, 'output_per_1k': 0.015}."""
+    if not pricing:
+        return Decimal('0')
+    cost = (usage['input_tokens'] / 1000 * float(pricing.get('input_per_1k', 0))
+            + usage['output_tokens'] / 1000 * float(pricing.get('output_per_1k', 0)))
+    return Decimal(str(round(cost, 6)))
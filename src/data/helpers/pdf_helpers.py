@@ -0,0 +1,83 @@
+import io
+
+from pypdf import PdfReader, PdfWriter
+
+
+class PayloadTooLargeError(ValueError):
+    """The PDF is still above the payload budget after preflight; retrying cannot help."""
+
+
+def get_pdf_stats(pdf_bytes: bytes, text_sample_pages: int = 3) -> dict:
+    """Cheap document stats used for model routing: byte size, page count and
+    whether the first pages yield extractable text (False for scanned PDFs)."""
+    stats = {'byte_size': len(pdf_bytes), 'page_count': None, 'has_text': False}
+    try:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        stats['page_count'] = len(reader.pages)
+        for page in reader.pages[:text_sample_pages]:
+            if (page.extract_text() or '').strip():
+                stats['has_text'] = True
+                break
+    except Exception as e:
+        print(f"Could not inspect PDF: {e}")
+    return stats
+
+
+def _downsample_page_images(page, max_dpi: int, jpeg_quality: int) -> int:
+    """Downsample images larger than max_dpi would need at full-page size. Returns the count replaced."""
+    # Upper bound on the rendered size of any image on this page, in pixels
+    page_inches = max(float(page.mediabox.width), float(page.mediabox.height)) / 72
+    max_pixels = max(1, int(page_inches * max_dpi))
+
+    replaced = 0
+    for image_file in page.images:
+        try:
+            image = image_file.image
+            if max(image.size) <= max_pixels:
+                continue
+            image.thumbnail((max_pixels, max_pixels))
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image_file.replace(image, quality=jpeg_quality)
+            replaced += 1
+        except Exception as e:
+            print(f"Skipping image {getattr(image_file, 'name', '?')} during preflight: {e}")
+    return replaced
+
+
+def preflight_pdf(pdf_bytes: bytes, preflight_config: dict) -> tuple[bytes, dict]:
+    """Shrink a PDF before it is sent to the model.
+
+    preflight_config keys: enabled, max_dpi (default 150), jpeg_quality (default 75) and
+    max_bytes, the payload budget; documents still above it are rejected.
+    Returns the (possibly) optimized bytes and a report with before/after sizes.
+    """
+    report = {'bytes_before': len(pdf_bytes), 'bytes_after': len(pdf_bytes), 'images_downsampled': 0}
+
+    if preflight_config.get('enabled'):
+        try:
+            writer = PdfWriter(clone_from=PdfReader(io.BytesIO(pdf_bytes)))
+            for page in writer.pages:
+                report['images_downsampled'] += _downsample_page_images(
+                    page,
+                    int(preflight_config.get('max_dpi', 150)),
+                    int(preflight_config.get('jpeg_quality', 75)),
+                )
+                page.compress_content_streams()
+            writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+
+            out = io.BytesIO()
+            writer.write(out)
+            optimized = out.getvalue()
+            # Only keep the rewrite when it actually helps
+            if len(optimized) < len(pdf_bytes):
+                pdf_bytes = optimized
+                report['bytes_after'] = len(pdf_bytes)
+        except Exception as e:
+            print(f"PDF preflight failed, sending original: {e}")
+
+    max_bytes = preflight_config.get('max_bytes')
+    if max_bytes and len(pdf_bytes) > int(max_bytes):
+        raise PayloadTooLargeError(f"PDF is {len(pdf_bytes)} bytes after preflight, above the {int(max_bytes)} byte budget")
+
+    return pdf_bytes, report
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+from usage_counters import LISTING_VERSION, STATUS_COUNTERS
+from helpers.dynamo_helpers import build_dynamo_update
+
+
+def build_status_transition_update(table_name: str, user_id: str, from_status: str | None, to_status: str,
+                                   bytes_processed: int = 0) -> dict:
+    """Update moving one document between the user's status counters.
+
+    Commit it in the same transaction as the PDF row write that changes the status, so
+    reconcile_user_stats never sees the row and the counters disagree.
+    """
+    values = {'#last': 'lastActivityAt', ':now': datetime.now(timezone.utc).isoformat(),
+              '#version': LISTING_VERSION, ':one': 1}
+    adds = ['#version :one']
+
+    if from_status != to_status:
+        if from_status in STATUS_COUNTERS:
+            values['#from'] = STATUS_COUNTERS[from_status]
+            values[':dec'] = -1
+            adds.append('#from :dec')
+        if to_status in STATUS_COUNTERS:
+            values['#to'] = STATUS_COUNTERS[to_status]
+            values[':inc'] = 1
+            adds.append('#to :inc')
+    if bytes_processed:
+        values[':bytes'] = bytes_processed
+        adds.append('bytesProcessed :bytes')
+
+    update_expression = 'SET #last = :now ADD ' + ', '.join(adds)
+
+    return build_dynamo_update(table_name, {'userId': user_id}, update_expression, values)
+
+
+def build_model_usage_updates(table_name: str, usage: dict) -> list[dict]:
+    """Updates rolling one document's usage into the per-model and per-config-version totals.
+
+    Applied in the same transaction as the LLM checkpoint, so a document is counted exactly once.
+    """
+    updates = []
+    for rollup_id in (f"model#{usage['model']}", f"config#{usage['config_version']}"):
+        updates.append(build_dynamo_update(
+            table_name,
+            {'id': rollup_id},
+            'SET updatedAt = :now ADD documents :one, inputTokens :in, '
+            'outputTokens :out, latencyMsTotal :lat, costUsd :cost',
+            {
+                ':now': datetime.now(timezone.utc).isoformat(),
+                ':one': 1,
+                ':in': usage['input_tokens'],
+                ':out': usage['output_tokens'],
+                ':lat': usage['latency_ms'],
+                ':cost': usage['cost_usd'],
+            },
+        ))
+    return updates
@@ -5,22 +5,50 @@ from datetime import datetime, timezone
 import json
 from langchain_aws import ChatBedrock
 from botocore.config import Config
+from botocore.exceptions import ClientError, ReadTimeoutError
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
-from helpers.dynamo_helpers import get_dynamo_item, update_dynamo_item
-from helpers.model_helpers import get_model_from_config
+from helpers.dynamo_helpers import get_dynamo_item, update_dynamo_item, build_dynamo_update, transact_update_items, is_conditional_check_failure
+from helpers.model_helpers import get_model_from_config, get_route_from_config, get_usage_from_message, get_cost_from_usage
+from helpers.pdf_helpers import get_pdf_stats, preflight_pdf, PayloadTooLargeError
 from helpers.prompt_helpers import get_prompt_from_config
+from helpers.metrics_helpers import emit_metric
+from helpers.stats_helpers import build_status_transition_update, build_model_usage_updates
+from processing_lanes import DEFAULT_LANE
 from xhtml2pdf import pisa
 import io
+import time
+import uuid
 load_dotenv('.env')
 
 s3 = boto3.client('s3')
+sqs = boto3.client('sqs')
 
 RAW_PDF_BUCKET_NAME = os.environ['RAW_PDF_BUCKET_NAME']
 PROCESSED_PDF_BUCKET_NAME = os.environ['PROCESSED_PDF_BUCKET_NAME']
 CONFIGS_TABLE_NAME = os.environ['CONFIGS_TABLE_NAME']
 PDFS_TABLE_NAME = os.environ['PDFS_TABLE_NAME']
+USER_QUOTA_TABLE_NAME = os.environ['USER_QUOTA_TABLE_NAME']
+USAGE_STATS_TABLE_NAME = os.environ['USAGE_STATS_TABLE_NAME']
+# Must outlive the processor timeout; an expired lease is treated as a crashed invocation
+PROCESSING_LEASE_SECONDS = int(os.environ.get('PROCESSING_LEASE_SECONDS', '90'))
+# Minimum remaining Lambda time needed to start a stage
+LLM_STAGE_MIN_SECONDS = int(os.environ.get('LLM_STAGE_MIN_SECONDS', '30'))
+RENDER_STAGE_MIN_SECONDS = int(os.environ.get('RENDER_STAGE_MIN_SECONDS', '10'))
+# Time kept back from the model call for the checkpoint write and lease release
+CHECKPOINT_MARGIN_SECONDS = int(os.environ.get('CHECKPOINT_MARGIN_SECONDS', '5'))
+# How soon a queued message is retried after a planned stop, instead of the full visibility timeout
+PLANNED_STOP_RETRY_SECONDS = int(os.environ.get('PLANNED_STOP_RETRY_SECONDS', '30'))
+THROTTLING_ERROR_CODES = {'ThrottlingException', 'TooManyRequestsException'}
+
+
+class DeadlineApproachingError(Exception):
+    pass
+
+
+class ModelThrottledError(Exception):
+    """Bedrock kept throttling after the client's retries; stopped like a deadline, not failed."""
 
 
 class ResponseModel(BaseModel):
@@ -29,77 +57,311 @@ class ResponseModel(BaseModel):
 
 def handler(event, context):
     print(json.dumps(event))
-    detail = event.get('detail', {})
-    key = detail['key']
-    user_id = detail['userId']
-    file_id = detail['fileId']
-    filename = detail['filename']
 
-    try:
-        update_dynamo_item(PDFS_TABLE_NAME, {'user_id': user_id, 'pdf_id': file_id}, "SET #s = :s", {
-            ':s': 'processing started',
-            '#s': 'status'
-        })
+    # Priority lanes deliver the EventBridge event wrapped in an SQS record
+    if 'Records' not in event:
+        return process_event(event, context)
 
-        pdf_bytes = s3.get_object(Bucket=RAW_PDF_BUCKET_NAME, Key=key)['Body'].read()
+    results = []
+    for record in event['Records']:
+        body = json.loads(record['body'])
+        lane = body.get('detail', {}).get('lane', DEFAULT_LANE)
+        sent_at_ms = int(record.get('attributes', {}).get('SentTimestamp', 0))
+        if sent_at_ms:
+            now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+            emit_metric('QueueWaitTime', now_ms - sent_at_ms, 'Milliseconds', {'Lane': lane})
+        try:
+            results.append(process_event(body, context))
+        except (DeadlineApproachingError, ModelThrottledError):
+            retry_sooner(record)
+            raise
+    return results
 
-        processing_config = get_dynamo_item(
-            CONFIGS_TABLE_NAME,
-            {'id': 'default_pdf_processing_config'}
+
+def retry_sooner(record: dict) -> None:
+    """Make a message released by a planned stop visible again after PLANNED_STOP_RETRY_SECONDS."""
+    arn = record.get('eventSourceARN', '')
+    if not arn.startswith('arn:aws:sqs:') or 'receiptHandle' not in record:
+        return
+    _, _, _, region, account, queue_name = arn.split(':', 5)
+    try:
+        sqs.change_message_visibility(
+            QueueUrl=f"https://sqs.{region}.amazonaws.com/{account}/{queue_name}",
+            ReceiptHandle=record['receiptHandle'],
+            VisibilityTimeout=PLANNED_STOP_RETRY_SECONDS,
         )
+    except Exception as e:
+        print(f"Could not shorten the retry delay, waiting for the visibility timeout: {e}")
 
-        if processing_config is None:
-            raise ValueError("Missing 'default_pdf_processing_config' in configs table. Please insert configuration before processing.")
 
-        today = datetime.now(timezone.utc).date()
+def claim_pdf(user_id: str, file_id: str, owner: str) -> dict | None:
+    """Take the processing lease on a PDF row. Returns the row as it was before the claim,
+    or None if another invocation holds a live lease or the PDF is already processed.
 
-        llm_model = get_model_from_config(processing_config)
-        prompt = get_prompt_from_config(processing_config.get('prompt_config', {}), pdf_bytes, file_id)
+    The status counters move in the same transaction, conditioned on the status read here.
+    """
+    now = int(time.time())
+    key = {'user_id': user_id, 'pdf_id': file_id}
+    previous = get_dynamo_item(PDFS_TABLE_NAME, key, consistent_read=True) or {}
+    if previous.get('status') == 'processing completed' or previous.get('lease_expires_at', 0) >= now:
+        return None
 
-        model_with_structured_output = llm_model.with_structured_output(ResponseModel)
-        chain = prompt | model_with_structured_output
+    values = {
+        ':s': 'processing started',
+        ':owner': owner,
+        ':exp': now + PROCESSING_LEASE_SECONDS,
+        ':now': now,
+        '#s': 'status',
+    }
+    if previous.get('status') is None:
+        status_condition = "attribute_not_exists(#s)"
+    else:
+        status_condition = "#s = :prev"
+        values[':prev'] = previous['status']
+    try:
+        transact_update_items([
+            build_dynamo_update(
+                PDFS_TABLE_NAME, key,
+                "SET #s = :s, lease_owner = :owner, lease_expires_at = :exp",
+                values,
+                condition_expression=f"(attribute_not_exists(lease_expires_at) OR lease_expires_at < :now) AND {status_condition}",
+            ),
+            build_status_transition_update(USER_QUOTA_TABLE_NAME, user_id, previous.get('status'), 'processing started'),
+        ])
+    except Exception as e:
+        if is_conditional_check_failure(e):
+            return None
+        raise
+    return previous
 
-        response = chain.invoke({'today': str(today)})
 
+def checkpoint_pdf(user_id: str, file_id: str, owner: str, attributes: dict, extra_updates: list[dict] | None = None) -> None:
+    """Durably record a completed stage on the PDF row and extend the lease.
 
-        # Read template
-        template_path = os.path.join(os.path.dirname(__file__), 'models', 'processed.html')
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template = f.read()
+    extra_updates (built with build_dynamo_update) are committed in the same transaction.
+    """
+    expression = "SET lease_expires_at = :exp"
+    values = {':owner': owner, ':exp': int(time.time()) + PROCESSING_LEASE_SECONDS}
+    for i, (name, value) in enumerate(attributes.items()):
+        expression += f", #c{i} = :c{i}"
+        values[f'#c{i}'] = name
+        values[f':c{i}'] = value
+    if extra_updates:
+        transact_update_items([
+            build_dynamo_update(PDFS_TABLE_NAME, {'user_id': user_id, 'pdf_id': file_id}, expression, values,
+                                condition_expression="lease_owner = :owner"),
+            *extra_updates,
+        ])
+        return
+    update_dynamo_item(PDFS_TABLE_NAME, {'user_id': user_id, 'pdf_id': file_id}, expression, values,
+                       condition_expression="lease_owner = :owner")
 
-        # Fill template
-        filled = template
-        filled = filled.replace('{{ description }}', response.description)
+
+def fail_pdf(user_id: str, file_id: str, owner: str, error_message: str) -> None:
+    """Mark the PDF failed and release the lease, so a retry can claim it straight away."""
+    try:
+        transact_update_items([
+            build_dynamo_update(PDFS_TABLE_NAME, {'user_id': user_id, 'pdf_id': file_id}, "SET #s = :s, error_message = :err REMOVE lease_owner, lease_expires_at", {
+                ':s': 'processing failed',
+                ':err': error_message,
+                ':owner': owner,
+                '#s': 'status'
+            }, condition_expression="lease_owner = :owner"),
+            build_status_transition_update(USER_QUOTA_TABLE_NAME, user_id, 'processing started', 'processing failed'),
+        ])
+    except Exception as e:
+        if not is_conditional_check_failure(e):
+            raise
+        print(f"Lease on {file_id} was taken over by another invocation")
+
+
+def ensure_time_left(context, required_seconds: int, stage: str) -> None:
+    """Stop before a stage that cannot finish in the remaining Lambda time, so the
+    retry resumes from the last checkpoint instead of the invocation being killed mid-stage."""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return
+    remaining_ms = context.get_remaining_time_in_millis()
+    if remaining_ms < required_seconds * 1000:
+        raise DeadlineApproachingError(f"Only {remaining_ms} ms left, not enough for the {stage} stage")
+
+
+def get_llm_time_budget(context) -> float | None:
+    """Seconds the model call, retries included, may take: the remaining Lambda time less the checkpoint margin."""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    time_budget = context.get_remaining_time_in_millis() / 1000 - CHECKPOINT_MARGIN_SECONDS
+    if time_budget <= 0:
+        raise DeadlineApproachingError("No time left for the model call after the checkpoint margin")
+    return time_budget
 
 
-        # Convert HTML to PDF
-        pdf_out = io.BytesIO()
-        pisa.CreatePDF(io.StringIO(filled), dest=pdf_out, encoding='utf-8')
-        pdf_data = pdf_out.getvalue()
+def _find_cause(error: BaseException | None, error_type: type) -> BaseException | None:
+    while error is not None and not isinstance(error, error_type):
+        error = error.__cause__ or error.__context__
+    return error
 
-        # Save
-        base_filename = filename[:-4] if filename.lower().endswith('.pdf') else filename
-        now = datetime.now(timezone.utc)
-        processed_key = f"{user_id}/{now.year}/{now.month:02d}/{now.day:02d}/{base_filename}_processed.pdf"
 
-        s3.put_object(Bucket=PROCESSED_PDF_BUCKET_NAME, Key=processed_key, Body=pdf_data, ContentType='application/pdf')
+def run_llm_stage(pdf_bytes: bytes, file_id: str, context=None) -> tuple[dict, dict]:
+    """Run the model on the PDF. Returns the structured result and the usage record for the document."""
+    processing_config = get_dynamo_item(
+        CONFIGS_TABLE_NAME,
+        {'id': 'default_pdf_processing_config'}
+    )
 
-        update_dynamo_item(PDFS_TABLE_NAME, {'user_id': user_id, 'pdf_id': file_id}, "SET #s = :s, processed_s3_uri = :uri, processed_at = :pa", {
-            ':s': 'processing completed',
-            ':uri': f's3://{PROCESSED_PDF_BUCKET_NAME}/{processed_key}',
-            ':pa': datetime.now(timezone.utc).isoformat(),
-            '#s': 'status'
-        })
+    if processing_config is None:
+        raise ValueError("Missing 'default_pdf_processing_config' in configs table. Please insert configuration before processing.")
+
+    today = datetime.now(timezone.utc).date()
+
+    pdf_bytes, preflight_report = preflight_pdf(pdf_bytes, processing_config.get('preflight', {}))
+    print(json.dumps({'fileId': file_id, 'preflight': preflight_report}))
+    emit_metric('PayloadBytesBeforePreflight', preflight_report['bytes_before'], 'Bytes')
+    emit_metric('PayloadBytesAfterPreflight', preflight_report['bytes_after'], 'Bytes')
+
+    pdf_stats = get_pdf_stats(pdf_bytes)
+    route = get_route_from_config(processing_config, pdf_stats)
+    print(json.dumps({'fileId': file_id, 'route': route['name'], **pdf_stats}))
+
+    time_budget = get_llm_time_budget(context)
+    llm_model = get_model_from_config(route, time_budget=time_budget)
+    prompt = get_prompt_from_config(processing_config.get('prompt_config', {}), pdf_bytes, file_id)
+
+    # include_raw keeps the AIMessage so its usage metadata is not lost
+    model_with_structured_output = llm_model.with_structured_output(ResponseModel, include_raw=True)
+    chain = prompt | model_with_structured_output
+
+    started = time.perf_counter()
+    try:
+        result = chain.invoke({'today': str(today)})
+    except Exception as e:
+        # Running out of the time budget or of throttling retries is a planned stop, not a failure
+        client_error = _find_cause(e, ClientError)
+        if client_error is not None and client_error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+            raise ModelThrottledError(f"Model call throttled: {client_error}") from e
+        if time_budget is not None and (_find_cause(e, ReadTimeoutError) is not None
+                                        or time.perf_counter() - started >= time_budget):
+            raise DeadlineApproachingError(f"Model call ran out of its {time_budget:.1f}s time budget") from e
+        raise
+    latency_ms = int((time.perf_counter() - started) * 1000)
+
+    response = result['parsed']
+    if response is None:
+        raise ValueError(f"Model output could not be parsed: {result.get('parsing_error')}")
+
+    usage = get_usage_from_message(result['raw'])
+    dimensions = {'Route': route['name']}
+    emit_metric('ModelLatency', latency_ms, 'Milliseconds', dimensions)
+    emit_metric('InputTokens', usage['input_tokens'], 'Count', dimensions)
+    emit_metric('OutputTokens', usage['output_tokens'], 'Count', dimensions)
+
+    model = route.get('model_config', {}).get('model', 'unknown')
+    usage.update({
+        'model': model,
+        'route': route['name'],
+        'config_version': str(processing_config.get('version', 'unversioned')),
+        'latency_ms': latency_ms,
+        'cost_usd': get_cost_from_usage(usage, processing_config.get('pricing', {}).get(model)),
+    })
+
+    return response.model_dump(), usage
+
+
+def run_render_stage(llm_result: dict, user_id: str, filename: str) -> str:
+    response = ResponseModel(**llm_result)
+
+    # Read template
+    template_path = os.path.join(os.path.dirname(__file__), 'models', 'processed.html')
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = f.read()
+
+    # Fill template
+    filled = template
+    filled = filled.replace('{{ description }}', response.description)
+
+
+    # Convert HTML to PDF
+    pdf_out = io.BytesIO()
+    pisa.CreatePDF(io.StringIO(filled), dest=pdf_out, encoding='utf-8')
+    pdf_data = pdf_out.getvalue()
+
+    # Save
+    base_filename = filename[:-4] if filename.lower().endswith('.pdf') else filename
+    now = datetime.now(timezone.utc)
+    processed_key = f"{user_id}/{now.year}/{now.month:02d}/{now.day:02d}/{base_filename}_processed.pdf"
+
+    s3.put_object(Bucket=PROCESSED_PDF_BUCKET_NAME, Key=processed_key, Body=pdf_data, ContentType='application/pdf')
+    return processed_key
+
+
+def process_event(event, context):
+    detail = event.get('detail', {})
+    key = detail['key']
+    user_id = detail['userId']
+    file_id = detail['fileId']
+    filename = detail['filename']
+
+    owner = getattr(context, 'aws_request_id', None) or str(uuid.uuid4())
+    previous = claim_pdf(user_id, file_id, owner)
+    if previous is None:
+        print(f"Skipping duplicate delivery for {file_id}: already claimed or processed")
+        return {'statusCode': 200, 'skipped': True, 'fileId': file_id}
+
+    try:
+        # Resume at the first stage without a checkpoint from an earlier attempt
+        llm_result = previous.get('checkpoint_llm_result')
+        processed_key = previous.get('checkpoint_processed_key')
+        if llm_result or processed_key:
+            print(json.dumps({'fileId': file_id, 'resumedLlm': bool(llm_result), 'resumedRender': bool(processed_key)}))
+
+        if processed_key is None:
+            if llm_result is None:
+                ensure_time_left(context, LLM_STAGE_MIN_SECONDS, 'llm')
+                pdf_bytes = s3.get_object(Bucket=RAW_PDF_BUCKET_NAME, Key=key)['Body'].read()
+                llm_result, usage = run_llm_stage(pdf_bytes, file_id, context)
+                # The usage rollup commits with the checkpoint, so a resumed run never misses or repeats it
+                checkpoint_pdf(user_id, file_id, owner, {'checkpoint_llm_result': llm_result, 'usage': usage},
+                               extra_updates=build_model_usage_updates(USAGE_STATS_TABLE_NAME, usage))
+
+            ensure_time_left(context, RENDER_STAGE_MIN_SECONDS, 'render')
+            processed_key = run_render_stage(llm_result, user_id, filename)
+            checkpoint_pdf(user_id, file_id, owner, {'checkpoint_processed_key': processed_key})
+
+        transact_update_items([
+            build_dynamo_update(PDFS_TABLE_NAME, {'user_id': user_id, 'pdf_id': file_id}, "SET #s = :s, processed_s3_uri = :uri, processed_at = :pa REMOVE lease_owner, lease_expires_at, checkpoint_llm_result, checkpoint_processed_key", {
+                ':s': 'processing completed',
+                ':uri': f's3://{PROCESSED_PDF_BUCKET_NAME}/{processed_key}',
+                ':pa': datetime.now(timezone.utc).isoformat(),
+                ':owner': owner,
+                '#s': 'status'
+            }, condition_expression="lease_owner = :owner"),
+            build_status_transition_update(USER_QUOTA_TABLE_NAME, user_id, 'processing started', 'processing completed',
+                                           bytes_processed=int(previous.get('size_bytes', 0))),
+        ])
 
         return {'statusCode': 200, 'processedKey': processed_key}
 
+    except (DeadlineApproachingError, ModelThrottledError) as e:
+        print(f"Stopping early on {file_id}: {e}")
+        try:
+            # Planned stop: keep the status and counters as they are and hand the lease to the retry
+            update_dynamo_item(PDFS_TABLE_NAME, {'user_id': user_id, 'pdf_id': file_id}, "REMOVE lease_owner, lease_expires_at", {
+                ':owner': owner,
+            }, condition_expression="lease_owner = :owner")
+        except Exception as release_error:
+            if not is_conditional_check_failure(release_error):
+                raise
+            print(f"Lease on {file_id} was taken over by another invocation")
+        raise  # Re-raise so the message is redelivered and resumes from the checkpoint
+
+    except PayloadTooLargeError as e:
+        # Retrying cannot shrink the file, so fail it once instead of cycling it to the DLQ
+        print(f"Rejecting {file_id}: {e}")
+        fail_pdf(user_id, file_id, owner, str(e))
+        return {'statusCode': 422, 'fileId': file_id, 'error': str(e)}
+
     except Exception as e:
         print(f"Error processing PDF: {e}")
-        update_dynamo_item(PDFS_TABLE_NAME, {'user_id': user_id, 'pdf_id': file_id}, "SET #s = :s, error_message = :err", {
-            ':s': 'processing failed',
-            ':err': str(e),
-            '#s': 'status'
-        })
+        fail_pdf(user_id, file_id, owner, str(e))
         raise  # Re-raise to trigger DLQ
 
 if __name__ == "__main__":
@@ -0,0 +1,14 @@
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(TESTS_DIR, '..'))
+sys.path.insert(0, os.path.join(TESTS_DIR, '..', '..', 'shared', 'python'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('RAW_PDF_BUCKET_NAME', 'raw-bucket')
+os.environ.setdefault('PROCESSED_PDF_BUCKET_NAME', 'processed-bucket')
+os.environ.setdefault('CONFIGS_TABLE_NAME', 'configs-table')
+os.environ.setdefault('PDFS_TABLE_NAME', 'pdfs-table')
+os.environ.setdefault('USER_QUOTA_TABLE_NAME', 'user-quota-table')
+os.environ.setdefault('USAGE_STATS_TABLE_NAME', 'usage-stats-table')
@@ -0,0 +1,210 @@
+"""In-memory stand-in for the low-level DynamoDB client used by helpers.dynamo_helpers.
+
+Supports get_item, update_item and transact_write_items with the subset of the
+expression language the processor uses: SET/REMOVE/ADD update clauses and
+conditions built from AND/OR/NOT, parentheses, attribute_exists/attribute_not_exists
+and the comparison operators. Items are kept in wire format and every operation holds
+one lock, so concurrent callers see DynamoDB's per-item atomicity.
+"""
+import re
+import threading
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+from dynamo_codec import deserialize_value
+
+_TOKEN = re.compile(r'\s*(<>|<=|>=|[=<>(),]|[#:]?[A-Za-z_][A-Za-z0-9_]*)')
+_CLAUSE = re.compile(r'\b(SET|REMOVE|ADD)\b')
+
+
+def _tokenize(expression: str) -> list[str]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Unsupported expression near {expression[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class _Condition:
+    """Recursive-descent evaluator for a ConditionExpression against one item."""
+
+    def __init__(self, expression: str, item: dict, names: dict, values: dict):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.item = item
+        self.names = names
+        self.values = values
+
+    def evaluate(self) -> bool:
+        result = self._or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected token {self.tokens[self.position]!r}")
+        return result
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _take(self, expected=None):
+        token = self._peek()
+        if expected is not None and token != expected:
+            raise ValueError(f"Expected {expected!r}, got {token!r}")
+        self.position += 1
+        return token
+
+    def _or(self) -> bool:
+        result = self._and()
+        while self._peek() == 'OR':
+            self._take()
+            right = self._and()
+            result = result or right
+        return result
+
+    def _and(self) -> bool:
+        result = self._not()
+        while self._peek() == 'AND':
+            self._take()
+            right = self._not()
+            result = result and right
+        return result
+
+    def _not(self) -> bool:
+        if self._peek() == 'NOT':
+            self._take()
+            return not self._not()
+        return self._primary()
+
+    def _primary(self) -> bool:
+        token = self._take()
+        if token == '(':
+            result = self._or()
+            self._take(')')
+            return result
+        if token in ('attribute_exists', 'attribute_not_exists'):
+            self._take('(')
+            exists = self._attribute_name(self._take()) in self.item
+            self._take(')')
+            return exists if token == 'attribute_exists' else not exists
+        left = self._operand(token)
+        operator = self._take()
+        right = self._operand(self._take())
+        # Comparisons against a missing attribute are false, as in DynamoDB
+        if left is None or right is None:
+            return False
+        return {
+            '=': left == right,
+            '<>': left != right,
+            '<': left < right,
+            '<=': left <= right,
+            '>': left > right,
+            '>=': left >= right,
+        }[operator]
+
+    def _attribute_name(self, token: str) -> str:
+        return self.names[token] if token.startswith('#') else token
+
+    def _operand(self, token: str):
+        if token.startswith(':'):
+            return deserialize_value(self.values[token])
+        attribute = self.item.get(self._attribute_name(token))
+        return None if attribute is None else deserialize_value(attribute)
+
+
+def _apply_update(item: dict, expression: str, names: dict, values: dict) -> None:
+    def name(token):
+        return names[token] if token.startswith('#') else token
+
+    parts = _CLAUSE.split(expression)
+    for clause, body in zip(parts[1::2], parts[2::2]):
+        for action in (a.strip() for a in body.split(',')):
+            if clause == 'SET':
+                path, value = (side.strip() for side in action.split('='))
+                item[name(path)] = values[value]
+            elif clause == 'REMOVE':
+                item.pop(name(action), None)
+            else:
+                path, value = action.split()
+                current = item.get(name(path), {'N': '0'})
+                item[name(path)] = {'N': str(Decimal(current['N']) + Decimal(values[value]['N']))}
+
+
+def _conditional_check_failed(operation: str) -> ClientError:
+    return ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'The conditional request failed'}},
+        operation,
+    )
+
+
+class FakeDynamoClient:
+    def __init__(self):
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(key: dict) -> tuple:
+        return tuple(sorted((name, tuple(value.items())) for name, value in key.items()))
+
+    def _table(self, table_name: str) -> dict:
+        return self.tables.setdefault(table_name, {})
+
+    def put(self, table_name: str, item: dict, key_names: tuple) -> None:
+        """Seed a wire-format item; key_names picks the key attributes out of it."""
+        with self.lock:
+            self._table(table_name)[self._key({k: item[k] for k in key_names})] = dict(item)
+
+    def item(self, table_name: str, key: dict) -> dict | None:
+        """Current wire-format item, for assertions."""
+        with self.lock:
+            item = self._table(table_name).get(self._key(key))
+            return dict(item) if item is not None else None
+
+    def _check(self, kwargs: dict) -> bool:
+        condition = kwargs.get('ConditionExpression')
+        if not condition:
+            return True
+        item = self._table(kwargs['TableName']).get(self._key(kwargs['Key']), {})
+        return _Condition(condition, item, kwargs.get('ExpressionAttributeNames', {}),
+                          kwargs.get('ExpressionAttributeValues', {})).evaluate()
+
+    def _update(self, kwargs: dict) -> dict:
+        table = self._table(kwargs['TableName'])
+        key = self._key(kwargs['Key'])
+        old = table.get(key)
+        new = dict(old) if old is not None else dict(kwargs['Key'])
+        _apply_update(new, kwargs['UpdateExpression'], kwargs.get('ExpressionAttributeNames', {}),
+                      kwargs.get('ExpressionAttributeValues', {}))
+        table[key] = new
+        return old or {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        with self.lock:
+            item = self._table(TableName).get(self._key(Key))
+            return {'Item': dict(item)} if item is not None else {}
+
+    def update_item(self, ReturnValues='NONE', **kwargs):
+        with self.lock:
+            if not self._check(kwargs):
+                raise _conditional_check_failed('UpdateItem')
+            old = self._update(kwargs)
+        return {'Attributes': old} if ReturnValues == 'ALL_OLD' and old else {}
+
+    def transact_write_items(self, TransactItems):
+        with self.lock:
+            reasons = [
+                {'Code': 'None'} if self._check(entry['Update']) else {'Code': 'ConditionalCheckFailed'}
+                for entry in TransactItems
+            ]
+            if any(reason['Code'] != 'None' for reason in reasons):
+                error = ClientError(
+                    {'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'}},
+                    'TransactWriteItems',
+                )
+                error.response['CancellationReasons'] = reasons
+                raise error
+            for entry in TransactItems:
+                self._update(entry['Update'])
+        return {}
@@ -0,0 +1,35 @@
+import pytest
+
+from helpers.model_helpers import get_model_from_config
+
+MODEL = 'anthropic.claude-3-haiku-20240307-v1:0'
+
+
+def build(boto_config: dict, time_budget: float | None):
+    return get_model_from_config({'model_config': {'model': MODEL, 'boto_config': boto_config}}, time_budget=time_budget)
+
+
+def test_without_budget_boto_config_is_used_as_is():
+    model = build({'read_timeout': 300, 'retries': {'max_attempts': 4, 'mode': 'standard'}}, None)
+
+    assert model.config.read_timeout == 300
+    # botocore stores max_attempts (retries only) as total_max_attempts
+    assert model.config.retries == {'total_max_attempts': 5, 'mode': 'standard'}
+
+
+@pytest.mark.parametrize('boto_config, time_budget, read_timeout, attempts', [
+    # Retries are kept while whole attempts fit in the budget
+    ({'read_timeout': 20, 'retries': {'max_attempts': 4, 'mode': 'standard'}}, 55, 20, 2),
+    # but never raised above what the config allows
+    ({'read_timeout': 5, 'retries': {'total_max_attempts': 3}}, 55, 5, 3),
+    # botocore defaults when boto_config sets neither
+    ({}, 130, 60, 2),
+    # A single attempt always runs, with the read timeout cut to the budget
+    ({'read_timeout': 300}, 12.5, 12.5, 1),
+])
+def test_budget_bounds_read_timeout_and_attempts(boto_config, time_budget, read_timeout, attempts):
+    model = build(boto_config, time_budget)
+
+    assert model.config.read_timeout == read_timeout
+    assert model.config.retries['total_max_attempts'] == attempts
+    assert 'max_attempts' not in model.config.retries
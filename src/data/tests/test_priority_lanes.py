@@ -0,0 +1,130 @@
+"""QueueWaitTime emitted by processor.handler for SQS-shaped records from each lane.
+
+Each lane is a local FIFO standing in for its SQS queue, drained on a simulated clock.
+The scheduling here only produces a mixed workload; what is checked is that the metric
+reports each message's own wait under its own lane. Lane routing and concurrency are
+EventBridge and Lambda configuration (infra/lib/data-stack.ts), not exercised here.
+"""
+import json
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import processor
+from processing_lanes import DEFAULT_LANE, LANES
+
+LANE_CONCURRENCY = {lane['name']: lane['maxConcurrency'] for lane in LANES}
+PROCESSING_SECONDS = 30
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class LocalQueue:
+    def __init__(self, lane: str):
+        self.lane = lane
+        self.messages = deque()
+
+    def send(self, event: dict, sent_at: datetime) -> None:
+        self.messages.append({
+            'messageId': f'{self.lane}-{len(self.messages)}',
+            'eventSource': 'aws:sqs',
+            'body': json.dumps(event),
+            'attributes': {'SentTimestamp': str(int(sent_at.timestamp() * 1000))},
+        })
+
+    def receive(self, max_messages: int) -> list[dict]:
+        return [self.messages.popleft() for _ in range(min(max_messages, len(self.messages)))]
+
+
+class SimulatedClock:
+    now = START
+
+    @classmethod
+    def advance(cls, seconds: int) -> None:
+        cls.now += timedelta(seconds=seconds)
+
+
+class FakeDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return SimulatedClock.now
+
+
+def upload_event(file_id: str, lane: str | None) -> dict:
+    detail = {'key': f'user/{file_id}.pdf', 'userId': 'user', 'fileId': file_id, 'filename': f'{file_id}.pdf'}
+    if lane is not None:
+        detail['lane'] = lane
+    return {'source': 'pdf-analyzer', 'detail-type': 'PDF_UPLOADED', 'detail': detail}
+
+
+def queue_wait_times(output: str) -> dict[str, list[int]]:
+    waits = {lane: [] for lane in LANE_CONCURRENCY}
+    for line in output.splitlines():
+        if not line.startswith('{'):
+            continue
+        record = json.loads(line)
+        if '_aws' in record and 'QueueWaitTime' in record:
+            waits[record['Lane']].append(record['QueueWaitTime'])
+    return waits
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    processed = []
+    SimulatedClock.now = START
+    monkeypatch.setattr(processor, 'datetime', FakeDatetime)
+    monkeypatch.setattr(processor, 'process_event',
+                        lambda event, context: processed.append(event['detail']) or {'statusCode': 200})
+    return processed
+
+
+def test_queue_wait_time_matches_each_delivery_under_mixed_burst(processed, capsys):
+    queues = {lane: LocalQueue(lane) for lane in LANE_CONCURRENCY}
+    # A free-tier burst lands just before a handful of paid uploads
+    for i in range(60):
+        queues['standard'].send(upload_event(f'free-{i}', 'standard'), START)
+    for i in range(8):
+        queues['priority'].send(upload_event(f'paid-{i}', 'priority'), START)
+
+    expected = {lane: [] for lane in LANE_CONCURRENCY}
+    while any(queue.messages for queue in queues.values()):
+        for lane, queue in queues.items():
+            # batchSize 1: every poller hands the handler a single record
+            for record in queue.receive(LANE_CONCURRENCY[lane]):
+                sent_ms = int(record['attributes']['SentTimestamp'])
+                expected[lane].append(int(SimulatedClock.now.timestamp() * 1000) - sent_ms)
+                processor.handler({'Records': [record]}, None)
+        SimulatedClock.advance(PROCESSING_SECONDS)
+
+    waits = queue_wait_times(capsys.readouterr().out)
+
+    assert len(processed) == 68
+    assert waits == expected
+    assert len(waits['priority']) == 8 and len(waits['standard']) == 60
+
+
+def test_event_without_lane_is_reported_under_default_lane(processed, capsys):
+    queue = LocalQueue(DEFAULT_LANE)
+    queue.send(upload_event('legacy', None), START)
+    SimulatedClock.advance(3)
+
+    processor.handler({'Records': queue.receive(1)}, None)
+
+    waits = queue_wait_times(capsys.readouterr().out)
+    assert waits[DEFAULT_LANE] == [3000]
+    assert processed[0]['fileId'] == 'legacy'
+
+
+def test_wait_time_is_measured_from_send_per_lane(processed, capsys):
+    queues = {lane: LocalQueue(lane) for lane in LANE_CONCURRENCY}
+    queues['standard'].send(upload_event('free', 'standard'), START)
+    SimulatedClock.advance(5)
+    queues['priority'].send(upload_event('paid', 'priority'), SimulatedClock.now)
+    SimulatedClock.advance(2)
+
+    for lane, queue in queues.items():
+        processor.handler({'Records': queue.receive(1)}, None)
+
+    waits = queue_wait_times(capsys.readouterr().out)
+    assert waits == {'priority': [2000], 'standard': [7000]}
+    assert [detail['lane'] for detail in processed] == ['priority', 'standard']
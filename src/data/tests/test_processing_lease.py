@@ -0,0 +1,244 @@
+"""Lease and checkpoint behaviour of processor.process_event under duplicate deliveries.
+
+DynamoDB is replaced by FakeDynamoClient, which honours the condition expressions,
+and S3 and the model by local recorders.
+"""
+import io
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import processor
+from helpers import dynamo_helpers
+from fake_dynamo import FakeDynamoClient
+from usage_counters import LISTING_VERSION
+
+USER_ID = 'user-1'
+FILE_ID = 'file-1'
+PDF_KEY = {'user_id': {'S': USER_ID}, 'pdf_id': {'S': FILE_ID}}
+QUOTA_KEY = {'userId': {'S': USER_ID}}
+
+serializer = TypeSerializer()
+
+
+class FakeS3:
+    def __init__(self):
+        self.puts = []
+        self.lock = threading.Lock()
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(b'%PDF-1.4 test document')}
+
+    def put_object(self, **kwargs):
+        with self.lock:
+            self.puts.append(kwargs['Key'])
+
+
+class FakeModel:
+    def __init__(self):
+        self.invocations = 0
+        self.lock = threading.Lock()
+
+    def _invoke(self, prompt_value):
+        with self.lock:
+            self.invocations += 1
+        # Hold the stage open so concurrent deliveries overlap with it
+        time.sleep(0.05)
+        raw = AIMessage(content='', usage_metadata={'input_tokens': 100, 'output_tokens': 20, 'total_tokens': 120})
+        return {'raw': raw, 'parsed': processor.ResponseModel(description='A test document'), 'parsing_error': None}
+
+    def with_structured_output(self, schema, include_raw=False):
+        return RunnableLambda(self._invoke)
+
+
+@pytest.fixture
+def env(monkeypatch):
+    dynamo = FakeDynamoClient()
+    s3 = FakeS3()
+    model = FakeModel()
+    dynamo.put(processor.CONFIGS_TABLE_NAME, {
+        'id': {'S': 'default_pdf_processing_config'},
+        'version': {'N': '1'},
+        'model_config': serializer.serialize({'model': 'test-model', 'boto_config': {}}),
+        'prompt_config': serializer.serialize({'system_message': 'Describe it.', 'user_message': 'What is this?'}),
+    }, ('id',))
+    dynamo.put(processor.PDFS_TABLE_NAME, {
+        **PDF_KEY,
+        'status': {'S': 'uploaded'},
+        'filename': {'S': 'report.pdf'},
+        'size_bytes': {'N': '1234'},
+    }, ('user_id', 'pdf_id'))
+    dynamo.put(processor.USER_QUOTA_TABLE_NAME, {
+        **QUOTA_KEY,
+        'docsTotal': {'N': '1'},
+        'docsUploaded': {'N': '1'},
+    }, ('userId',))
+
+    monkeypatch.setattr(dynamo_helpers, 'boto3', SimpleNamespace(client=lambda service: dynamo))
+    monkeypatch.setattr(processor, 's3', s3)
+    monkeypatch.setattr(processor, 'get_model_from_config', lambda route, time_budget=None: model)
+    return SimpleNamespace(dynamo=dynamo, s3=s3, model=model)
+
+
+def make_event() -> dict:
+    return {'detail': {'key': f'{USER_ID}/report.pdf', 'userId': USER_ID, 'fileId': FILE_ID, 'filename': 'report.pdf'}}
+
+
+def make_context(request_id: str) -> SimpleNamespace:
+    return SimpleNamespace(aws_request_id=request_id, get_remaining_time_in_millis=lambda: 60_000)
+
+
+def counters(env) -> dict:
+    quota = env.dynamo.item(processor.USER_QUOTA_TABLE_NAME, QUOTA_KEY)
+    return {name: int(value['N']) for name, value in quota.items() if 'N' in value and name != LISTING_VERSION}
+
+
+def listing_version(env) -> int:
+    return int(env.dynamo.item(processor.USER_QUOTA_TABLE_NAME, QUOTA_KEY)[LISTING_VERSION]['N'])
+
+
+def test_concurrent_deliveries_run_each_stage_once(env):
+    deliveries = 8
+    barrier = threading.Barrier(deliveries)
+    results = [None] * deliveries
+
+    def deliver(i):
+        barrier.wait()
+        results[i] = processor.process_event(make_event(), make_context(f'request-{i}'))
+
+    threads = [threading.Thread(target=deliver, args=(i,)) for i in range(deliveries)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert env.model.invocations == 1
+    assert len(env.s3.puts) == 1
+    assert sum(1 for result in results if result.get('processedKey')) == 1
+    assert sum(1 for result in results if result.get('skipped')) == deliveries - 1
+
+    row = env.dynamo.item(processor.PDFS_TABLE_NAME, PDF_KEY)
+    assert row['status'] == {'S': 'processing completed'}
+    assert 'lease_owner' not in row and 'checkpoint_llm_result' not in row
+    # Counters moved with the row: one claim and one completion, however many deliveries raced
+    assert counters(env) == {'docsTotal': 1, 'docsUploaded': 0, 'docsProcessing': 0, 'docsCompleted': 1,
+                             'bytesProcessed': 1234}
+    # and the listing version moved with each of them
+    assert listing_version(env) == 2
+
+    # Usage is rolled up once, in the checkpoint transaction
+    rollup = env.dynamo.item(processor.USAGE_STATS_TABLE_NAME, {'id': {'S': 'model#test-model'}})
+    assert rollup['documents'] == {'N': '1'}
+
+
+def test_expired_lease_is_reclaimed_and_resumes_from_checkpoint(env):
+    env.dynamo.put(processor.PDFS_TABLE_NAME, {
+        **PDF_KEY,
+        'status': {'S': 'processing started'},
+        'filename': {'S': 'report.pdf'},
+        'lease_owner': {'S': 'crashed-request'},
+        'lease_expires_at': {'N': str(int(time.time()) - 1)},
+        'checkpoint_llm_result': serializer.serialize({'description': 'From the crashed run'}),
+    }, ('user_id', 'pdf_id'))
+
+    result = processor.process_event(make_event(), make_context('retry-request'))
+
+    assert result['statusCode'] == 200 and result['processedKey']
+    assert env.model.invocations == 0
+    assert len(env.s3.puts) == 1
+    row = env.dynamo.item(processor.PDFS_TABLE_NAME, PDF_KEY)
+    assert row['status'] == {'S': 'processing completed'}
+    assert 'lease_owner' not in row
+
+
+def test_live_lease_is_not_reclaimed(env):
+    env.dynamo.put(processor.PDFS_TABLE_NAME, {
+        **PDF_KEY,
+        'status': {'S': 'processing started'},
+        'lease_owner': {'S': 'running-request'},
+        'lease_expires_at': {'N': str(int(time.time()) + 60)},
+    }, ('user_id', 'pdf_id'))
+
+    result = processor.process_event(make_event(), make_context('duplicate-request'))
+
+    assert result['skipped']
+    assert env.model.invocations == 0 and env.s3.puts == []
+    assert env.dynamo.item(processor.PDFS_TABLE_NAME, PDF_KEY)['lease_owner'] == {'S': 'running-request'}
+
+
+def test_superseded_owner_cannot_complete(env, monkeypatch):
+    checkpoint_pdf = processor.checkpoint_pdf
+
+    def checkpoint_then_lose_lease(user_id, file_id, owner, attributes, extra_updates=None):
+        checkpoint_pdf(user_id, file_id, owner, attributes, extra_updates)
+        if 'checkpoint_processed_key' in attributes:
+            # Another invocation reclaims the lease before the completion write
+            env.dynamo.update_item(
+                TableName=processor.PDFS_TABLE_NAME, Key=PDF_KEY,
+                UpdateExpression='SET lease_owner = :owner',
+                ExpressionAttributeValues={':owner': {'S': 'new-owner'}},
+            )
+
+    monkeypatch.setattr(processor, 'checkpoint_pdf', checkpoint_then_lose_lease)
+
+    with pytest.raises(Exception) as error:
+        processor.process_event(make_event(), make_context('slow-request'))
+
+    assert dynamo_helpers.is_conditional_check_failure(error.value)
+    row = env.dynamo.item(processor.PDFS_TABLE_NAME, PDF_KEY)
+    # Neither the completion nor the failure write landed over the new owner's lease
+    assert row['status'] == {'S': 'processing started'}
+    assert row['lease_owner'] == {'S': 'new-owner'}
+    assert 'checkpoint_processed_key' in row
+    assert counters(env) == {'docsTotal': 1, 'docsUploaded': 0, 'docsProcessing': 1}
+
+
+class FakeSqs:
+    def __init__(self):
+        self.visibility_changes = []
+
+    def change_message_visibility(self, **kwargs):
+        self.visibility_changes.append(kwargs)
+
+
+def test_throttled_model_releases_lease_without_failing(env, monkeypatch):
+    def throttled(prompt_value):
+        raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+
+    monkeypatch.setattr(env.model, 'with_structured_output', lambda schema, include_raw=False: RunnableLambda(throttled))
+    sqs = FakeSqs()
+    monkeypatch.setattr(processor, 'sqs', sqs)
+    record = {
+        'body': json.dumps(make_event()),
+        'receiptHandle': 'receipt-1',
+        'eventSourceARN': 'arn:aws:sqs:us-east-1:123456789012:pdf-analyzer-standard-lane-dev',
+        'attributes': {},
+    }
+
+    with pytest.raises(processor.ModelThrottledError):
+        processor.handler({'Records': [record]}, make_context('throttled-request'))
+
+    # Planned stop: the lease is handed back, the status and counters stay at 'processing started'
+    row = env.dynamo.item(processor.PDFS_TABLE_NAME, PDF_KEY)
+    assert row['status'] == {'S': 'processing started'}
+    assert 'lease_owner' not in row and 'error_message' not in row
+    assert counters(env) == {'docsTotal': 1, 'docsUploaded': 0, 'docsProcessing': 1}
+    # and the message comes back after the short retry delay, not the visibility timeout
+    assert sqs.visibility_changes == [{
+        'QueueUrl': 'https://sqs.us-east-1.amazonaws.com/123456789012/pdf-analyzer-standard-lane-dev',
+        'ReceiptHandle': 'receipt-1',
+        'VisibilityTimeout': processor.PLANNED_STOP_RETRY_SECONDS,
+    }]
+
+    # The redelivery claims the PDF again and completes it
+    monkeypatch.setattr(env.model, 'with_structured_output', FakeModel.with_structured_output.__get__(env.model))
+    result = processor.process_event(make_event(), make_context('retry-request'))
+    assert result['processedKey']
+    assert counters(env)['docsCompleted'] == 1 and counters(env)['docsProcessing'] == 0
@@ -16,6 +16,61 @@ export function useApi() {
     return res.json()
   }
 
+  // Lambda rejects synchronous request bodies over 6 MB, so batches are split into
+  // requests whose base64 payload stays under this budget
+  const MAX_BATCH_PAYLOAD_CHARS = 5_000_000
+
+  async function uploadPdfBatch(idToken: string, files: File[]) {
+    const encoded = await Promise.all(files.map((file) => new Promise<{ filename: string, file: string }>((resolve) => {
+      const reader = new FileReader()
+      reader.onload = () => resolve({ filename: file.name, file: (reader.result as string).split(',')[1] })
+      reader.readAsDataURL(file)
+    })))
+
+    const results: any[] = []
+    const chunks: { index: number, filename: string, file: string }[][] = []
+    let current: { index: number, filename: string, file: string }[] = []
+    let currentSize = 0
+    encoded.forEach((entry, index) => {
+      const size = entry.file.length + entry.filename.length
+      if (size > MAX_BATCH_PAYLOAD_CHARS) {
+        results.push({ index, filename: entry.filename, success: false, error: 'File too large' })
+        return
+      }
+      if (current.length && currentSize + size > MAX_BATCH_PAYLOAD_CHARS) {
+        chunks.push(current)
+        current = []
+        currentSize = 0
+      }
+      current.push({ index, ...entry })
+      currentSize += size
+    })
+    if (current.length) chunks.push(current)
+
+    for (const chunk of chunks) {
+      const res = await fetch(`${config.public.apiUrl}/upload/batch`, {
+        method: 'POST',
+        headers: { Authorization: `Bearer ${idToken}`, 'Content-Type': 'application/json' },
+        body: JSON.stringify({ files: chunk.map(({ filename, file }) => ({ filename, file })) }),
+      })
+      // Error statuses (400, 403, 502) carry per-file results too; only fall back to a
+      // chunk-wide error when the body has none, e.g. a gateway error page
+      const data = await res.json().catch(() => null)
+      if (!Array.isArray(data?.files)) {
+        const error = data?.error || 'Batch upload failed'
+        chunk.forEach(({ index, filename }) => results.push({ index, filename, success: false, error }))
+        continue
+      }
+      for (const file of data.files) {
+        results.push({ ...file, index: chunk[file.index].index })
+      }
+    }
+
+    results.sort((a, b) => a.index - b.index)
+    const uploaded = results.filter((r) => r.success).length
+    return { uploaded, failed: results.length - uploaded, files: results }
+  }
+
   async function getProcessedPdfs(idToken: string) {
     const res = await fetch(`${config.public.apiUrl}/processed`, {
       headers: { Authorization: `Bearer ${idToken}` },
@@ -40,5 +95,5 @@ export function useApi() {
     return res.json()
   }
 
-  return { uploadPdf, getProcessedPdfs, getPlans, createCheckoutSession }
+  return { uploadPdf, uploadPdfBatch, getProcessedPdfs, getPlans, createCheckoutSession }
 }
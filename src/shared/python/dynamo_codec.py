@@ -0,0 +1,58 @@
+"""Decode DynamoDB low-level wire format straight into JSON-ready Python values.
+
+Shared by the backend and data Lambdas through the shared layer (src/shared is
+mounted at /opt/python); add src/shared/python to PYTHONPATH when running locally.
+
+Compared with the boto3 resource layer followed by a recursive Decimal conversion,
+this is a single pass: numbers become int/float directly, sets become lists and
+binary values become base64 strings, so results can be passed to json.dumps as-is.
+"""
+import base64
+from decimal import Decimal
+
+
+def _number(value: str) -> int | float:
+    if '.' in value or 'e' in value or 'E' in value:
+        # Decide integer-ness on the exact decimal: float() would round large
+        # non-integers such as 12345678901234567890.5 onto an integer
+        number = Decimal(value)
+        if number == number.to_integral_value():
+            return int(number)
+        return float(number)
+    return int(value)
+
+
+def deserialize_value(attribute: dict):
+    for tag, value in attribute.items():
+        if tag == 'S':
+            return value
+        if tag == 'N':
+            return _number(value)
+        if tag == 'M':
+            return {k: deserialize_value(v) for k, v in value.items()}
+        if tag == 'L':
+            return [deserialize_value(v) for v in value]
+        if tag == 'BOOL':
+            return value
+        if tag == 'NULL':
+            return None
+        if tag == 'SS':
+            return list(value)
+        if tag == 'NS':
+            return [_number(v) for v in value]
+        if tag == 'B':
+            return base64.b64encode(value).decode('ascii')
+        if tag == 'BS':
+            return [base64.b64encode(v).decode('ascii') for v in value]
+        raise ValueError(f"Unknown DynamoDB attribute type: {tag}")
+    raise ValueError("Empty DynamoDB attribute value")
+
+
+def deserialize_item(item: dict | None) -> dict | None:
+    if item is None:
+        return None
+    return {k: deserialize_value(v) for k, v in item.items()}
+
+
+def deserialize_items(items: list[dict]) -> list[dict]:
+    return [{k: deserialize_value(v) for k, v in item.items()} for item in items]
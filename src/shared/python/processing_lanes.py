@@ -0,0 +1,13 @@
+"""Processing lanes, shared with the data stack (infra/lib/data-stack.ts) through processing_lanes.json.
+
+Paid and free uploads are queued separately so a free-tier burst cannot delay paying
+subscribers. Each lane caps how many processors it may occupy (maxConcurrency). The
+default lane also takes PDF_UPLOADED events that carry no lane.
+"""
+import json
+import os
+
+with open(os.path.join(os.path.dirname(__file__), 'processing_lanes.json'), encoding='utf-8') as f:
+    LANES = json.load(f)
+
+DEFAULT_LANE = next(lane['name'] for lane in LANES if lane.get('default'))
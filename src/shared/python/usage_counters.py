@@ -0,0 +1,18 @@
+"""Per-user usage counters kept on the quota table.
+
+Used by upload/processor status transitions, the reconcile_user_stats job and the
+get_user_pdfs listing.
+"""
+
+# Per-user counter attribute on the quota table for each PDF status
+STATUS_COUNTERS = {
+    'uploaded': 'docsUploaded',
+    'processing started': 'docsProcessing',
+    'processing completed': 'docsCompleted',
+    'processing failed': 'docsFailed',
+}
+
+# Bumped by every counter update, which commits with the PDF row writes it accounts for,
+# so listing polls can tell nothing changed with one GetItem. The reconcile job never
+# writes it, so it only moves forward.
+LISTING_VERSION = 'listingVersion'